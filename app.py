@@ -4,7 +4,7 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 
-from db_access import DbAccess
+from db_session import get_legacy_db
 from transaction_entry import display_transaction_entry
 from search_tab import display_search
 from delete_tab import display_delete
@@ -20,7 +20,7 @@ st.set_page_config(layout="wide")
 
 st.sidebar.markdown('# Expense App')
 
-data_db = DbAccess(Path('example.db'))
+data_db = get_legacy_db(st, Path('example.db'))
 
 modes = [
     'Entry', 
@@ -10,18 +10,21 @@ import view_translation as vt
 
 FOURTEEN_DAYS = pd.Timedelta(days=14)
 
-def attempt_assignment(st: stl, db: DbAccess, potential_matches: pd.DataFrame, description: str, entry: dict):
+def attempt_assignment(st: stl, db: DbAccess, potential_matches: pd.DataFrame, description: str, entry: dict, assignments: dict):
     potential_transaction_id = potential_matches['taction_id'].values[0]
     previous_assignments = db.get_statement_transactions(request_taction_id=potential_transaction_id)
-    if len(previous_assignments) > 0:
+    if len(previous_assignments) > 0 or potential_transaction_id in assignments.values():
         st.markdown(f"{description} already assigned")
     else:
         st.markdown(f"Assigning {description}")
-        db.assign_statement_entry(entry['id'], potential_transaction_id)
+        assignments[entry['id']] = potential_transaction_id
 
 def auto_assign(st: stl, db: DbAccess, entries: list):
     st.markdown('### Auto-Assignment')
 
+    # Matched first and assigned together, so the write queue is only held
+    # for the assignments themselves
+    assignments = {}
     for entry in entries:
         entry_date = entry['date']
         min_date = entry_date - FOURTEEN_DAYS
@@ -32,12 +35,12 @@ def auto_assign(st: stl, db: DbAccess, entries: list):
             before_date = max_date,
             account_id = entry['account_id'],
         )
-        
+    
         description = entry['description']
         if len(potential_matches) == 0:
             st.markdown(f"No matches for {description}")
         elif len(potential_matches) == 1:
-            attempt_assignment(st, db, potential_matches, description, entry)
+            attempt_assignment(st, db, potential_matches, description, entry, assignments)
         else:
             precise_potential_matches = db.get_transactions(
                 amount = entry['amount'],
@@ -46,7 +49,12 @@ def auto_assign(st: stl, db: DbAccess, entries: list):
                 account_id = entry['account_id'],
             )
             if len(precise_potential_matches) == 1:
-                attempt_assignment(st, db, precise_potential_matches, description, entry)
+                attempt_assignment(st, db, precise_potential_matches, description, entry, assignments)
             else:
                 st.markdown(f'Multiple matching transactions for {description}')
-                st.write(vt.translate_transactions(potential_matches.copy(deep=True)))
\ No newline at end of file
+                st.write(vt.translate_transactions(potential_matches.copy(deep=True)))
+
+    if len(assignments) > 0:
+        with db.transaction():
+            for entry_id, taction_id in assignments.items():
+                db.assign_statement_entry(entry_id, taction_id)
\ No newline at end of file
@@ -8,12 +8,7 @@ import pandas as pd
 from newdb_access import DbAccess
 import view_translation as vt
 from common import ZERO
-
-def convert_df(df):
-   return df.to_csv().encode('utf-8')
-
-def convert_df(df):
-   return df.to_csv().encode('utf-8')
+from export import view_export
 
 def show_detailed_account(db: DbAccess, account_name: str, account_data: pd.DataFrame):
     reverse_balance = Decimal(str(st.number_input('Reverse Balance Start', step=0.01)))
@@ -39,14 +34,7 @@ def view_balances(db: DbAccess):
     account_data = db.get_accounts()
     st.markdown(f"Total Balance: ${account_data['balance'].sum()}")
     st.write(vt.translate_accounts(account_data))
-    csv = convert_df(account_data)
-    st.download_button(
-        "Press to Download",
-        csv,
-        "searach.csv",
-        "text/csv",
-        key='download-csv'
-    )
+    view_export(st, 'accounts-export', 'accounts', lambda: [account_data])
 
     account_data = db.get_accounts()
     account_names = ['None'] + list(account_data['name'])
@@ -63,13 +51,6 @@ def view_balances(db: DbAccess):
     st.markdown(f"Sum positive budgets: {budget_data.loc[budget_data['balance'] > ZERO, 'balance'].sum()}")
     st.markdown(f"Sum negative budgets: {budget_data.loc[budget_data['balance'] < ZERO, 'balance'].sum()}")
     st.write(vt.translate_budgets(budget_data))
-    csv = convert_df(budget_data)
-    st.download_button(
-        "Press to Download",
-        csv,
-        "searach.csv",
-        "text/csv",
-        key='download-csv'
-    )
+    view_export(st, 'budgets-export', 'budgets', lambda: [budget_data])
 
     
\ No newline at end of file
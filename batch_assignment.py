@@ -6,7 +6,7 @@ import streamlit as stl
 import pandas as pd
 
 from newdb_access import DbAccess
-from ml_statement import predict_category
+from ml_statement import learn_assignments
 import view_translation as vt
 
 def batch_assignment(
@@ -49,10 +49,14 @@ def batch_assignment(
             date = left.date_input(f'Date #{i}', value=entry['date'])
             amount = Decimal(str(right.number_input(f'Amount #{i}', value=float(entry['amount']), step=0.01)))
             left, middle, right = st.columns(3)
-            default_category_index = list(categories['name']).index(db.category_translate(
-                predict_category(entry),
-                'name',
-            ))
+            # Entries carry their stored prediction, see get_predicted_statements
+            if pd.isna(entry['predicted_category_id']):
+                default_category_index = 0
+            else:
+                default_category_index = list(categories['name']).index(db.category_translate(
+                    entry['predicted_category_id'],
+                    'name',
+                ))
             category = left.selectbox(
                 f'Category #{i}', 
                 options=categories['name'],
@@ -105,23 +109,25 @@ def batch_assignment(
                 st.write(vt.translate_transactions(amount_matches.copy(deep=True)))
             i += 1
         if st.form_submit_button('Process'):
-            for item in defer_list:
-                st.markdown(f'Deferring {item}')
-                db.defer_statement(item)
-            for statement_id, taction_id in assign_list:
-                st.markdown(f'Assigning statement {statement_id} to taction {taction_id}')
-                db.assign_statement_entry(statement_id, taction_id)
-            for data in add_list:
-                st.markdown(f"Creating new transaction for statement {data['entry_id']}")
-                taction_id = db.add_transaction(
-                    data['date'],
-                    data['account'],
-                    data['method'],
-                    data['description'],
-                    False,
-                    data['amount'],
-                    data['subs'],
-                )
-                db.assign_statement_entry(data['entry_id'], taction_id)
-                if data['deferred'] == 1:
-                    db.undefer_statement(data['entry_id'])
\ No newline at end of file
+            with db.transaction():
+                for item in defer_list:
+                    st.markdown(f'Deferring {item}')
+                    db.defer_statement(item)
+                for statement_id, taction_id in assign_list:
+                    st.markdown(f'Assigning statement {statement_id} to taction {taction_id}')
+                    db.assign_statement_entry(statement_id, taction_id)
+                for data in add_list:
+                    st.markdown(f"Creating new transaction for statement {data['entry_id']}")
+                    taction_id = db.add_transaction(
+                        data['date'],
+                        data['account'],
+                        data['method'],
+                        data['description'],
+                        False,
+                        data['amount'],
+                        data['subs'],
+                    )
+                    db.assign_statement_entry(data['entry_id'], taction_id)
+                    if data['deferred'] == 1:
+                        db.undefer_statement(data['entry_id'])
+            learn_assignments(db)
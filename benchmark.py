@@ -0,0 +1,571 @@
+""" Data layer benchmarks
+
+python benchmark.py migrations [tactions]
+python benchmark.py queries [tactions]
+python benchmark.py money [tactions]
+python benchmark.py inserts [tactions]
+python benchmark.py writers [sessions] [transactions]
+python benchmark.py features [tactions]
+python benchmark.py views [tactions]
+python benchmark.py suite [sizes] [output]
+"""
+
+from pathlib import Path
+import datetime
+import io
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+
+import pandas as pd
+
+from decimal import Decimal
+
+import db_access
+from newdb_access import DbAccess
+from migrations import migrate
+from synthetic_ledger import build_ledger
+from db_session import BUSY_TIMEOUT, configure_connection
+from write_queue import WriteQueue
+from statement_features import NUMERIC_COLUMNS, StatementFeaturizer
+
+REPEATS = 5
+SUITE_SIZES = [10000, 100000, 1000000]
+# SVC training grows roughly with the square of the statement count
+TRAIN_MODEL_LIMIT = 20000
+WRITERS_LEDGER_SIZE = 10000
+FEATURE_VOCABULARY_SIZES = [100, 250, 500, 1000]
+# (mode, through a write queue, busy timeout in seconds)
+WRITER_MODES = [
+    ('direct', False, BUSY_TIMEOUT),
+    ('direct, 0.5 s timeout', False, 0.5),
+    ('queued', True, BUSY_TIMEOUT),
+    ('queued, 0.5 s timeout', True, 0.5),
+]
+
+def time_call(func, repeats: int = REPEATS) -> float:
+    """ Best wall time in milliseconds """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        elapsed = (time.perf_counter() - start) * 1000.0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def get_query_shapes(db: DbAccess) -> dict:
+    after_date = pd.to_datetime('2016-01-01')
+    before_date = pd.to_datetime('2016-02-01')
+    return {
+        'get_transactions(account, month)': lambda: db.get_transactions(account_id=2, after_date=after_date, before_date=before_date),
+        'get_transactions(amount, account)': lambda: db.get_transactions(amount=-12.34, account_id=2),
+        'get_transactions(taction_id)': lambda: db.get_transactions(taction_id_request=1234),
+        'get_transactions(links, account, month)': lambda: db.get_transactions(account_id=2, after_date=after_date, before_date=before_date, include_statement_links=True),
+        'get_subtotals(category, month)': lambda: db.get_subtotals(category_id=3, after_date=after_date, before_date=before_date),
+        'get_subtotals(taction_id)': lambda: db.get_subtotals(taction_id=1234),
+        'get_statement_transactions(taction_id)': lambda: db.get_statement_transactions(request_taction_id=1234),
+        'get_statement_transactions(account, month)': lambda: db.get_statement_transactions(account_id=2, after_date=after_date, before_date=before_date),
+        'get_hsa_distributions(source_id)': lambda: db.get_hsa_distributions(source_id='synthetic-1'),
+    }
+
+def benchmark_migrations(tactions: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        build_ledger(db_file, tactions)
+
+        db = DbAccess(db_file, run_migrations=False)
+        before = {name: time_call(func) for name, func in get_query_shapes(db).items()}
+        start = time.perf_counter()
+        migrate(db.con)
+        migrate_ms = (time.perf_counter() - start) * 1000.0
+        after = {name: time_call(func) for name, func in get_query_shapes(db).items()}
+        db.con.close()
+
+    print(f'Migration and ANALYZE: {migrate_ms:.0f} ms')
+    print(f"{'query':<45}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in before:
+        print(f'{name:<45}{before[name]:>12.2f}{after[name]:>12.2f}{before[name] / after[name]:>9.1f}x')
+
+def time_lookups(func, values: list) -> float:
+    """ Mean microseconds per call """
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    return (time.perf_counter() - start) * 1e6 / len(values)
+
+def benchmark_queries(tactions: int, lookups: int = 5000):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        build_ledger(db_file, tactions)
+        db = DbAccess(db_file)
+        ids = [(i * 7919) % tactions for i in range(lookups)]
+        dates = [str(datetime.date(2012, 1, 1) + datetime.timedelta(days=i % 3650)) for i in range(lookups)]
+
+        # Pasted values give every lookup its own SQL text, so each one is
+        # compiled again; bound values reuse the cached statement
+        sub_sql = 'SELECT * FROM sub WHERE valid = 1 AND not_real = 0'
+        statement_sql = 'SELECT * FROM statement_transactions WHERE account_id = 2'
+        results = {
+            'sub by taction_id, literal': time_lookups(lambda i: db.con.execute(f'{sub_sql} AND taction_id = {i}').fetchall(), ids),
+            'sub by taction_id, bound': time_lookups(lambda i: db.con.execute(f'{sub_sql} AND taction_id = ?', (i,)).fetchall(), ids),
+            'statement by account and date, literal': time_lookups(lambda date: db.con.execute(f"{statement_sql} AND date >= date('{date}') AND date <= date('{date}', '+7 days')").fetchall(), dates),
+            'statement by account and date, bound': time_lookups(lambda date: db.con.execute(f"{statement_sql} AND date >= date(?) AND date <= date(?, '+7 days')", (date, date)).fetchall(), dates),
+            'DbAccess.get_subtotals(taction_id)': time_lookups(lambda i: db.get_subtotals(taction_id=i), ids[:1000]),
+        }
+        db.con.close()
+
+    print(f"{'lookup':<45}{'us per query':>14}")
+    for name, value in results.items():
+        print(f'{name:<45}{value:>14.1f}')
+
+def benchmark_money(tactions: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        build_ledger(db_file, tactions)
+        decimal_db = DbAccess(db_file)
+        cents_db = DbAccess(db_file, integer_cents=True)
+
+        results = {}
+        for label, db, threshold in [('Decimal', decimal_db, Decimal('-50.00')), ('cents', cents_db, -5000)]:
+            start = time.perf_counter()
+            subs = db.get_subtotals()
+            load_ms = (time.perf_counter() - start) * 1000.0
+            results[label] = {
+                'subs': len(subs),
+                'load ms': load_ms,
+                'sum ms': time_call(lambda: subs['amount'].sum(), repeats=3),
+                'groupby sum ms': time_call(lambda: subs.groupby('category_id')['amount'].sum(), repeats=3),
+                'filter ms': time_call(lambda: subs.loc[subs['amount'] < threshold, :], repeats=3),
+                'amount MB': subs['amount'].memory_usage(deep=True) / 1e6,
+            }
+        decimal_db.con.close()
+        cents_db.con.close()
+
+    print(f"{'measure':<20}{'Decimal':>12}{'cents':>12}")
+    for measure in results['Decimal']:
+        print(f"{measure:<20}{results['Decimal'][measure]:>12.1f}{results['cents'][measure]:>12.1f}")
+
+def benchmark_inserts(tactions: int, inserts: int = 200):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        build_ledger(db_file, tactions)
+        db = DbAccess(db_file)
+        date = pd.to_datetime('2020-01-01')
+        results = {
+            'allocate_ids(statement_transactions)': time_lookups(lambda _: db.allocate_ids('statement_transactions'), range(inserts)),
+            'add_statement_transaction': time_lookups(lambda _: db.add_statement_transaction(date, 1, 2020, 2, Decimal('-1.00'), description='benchmark'), range(inserts)),
+            'add_transaction, 3 subs': time_lookups(lambda _: db.add_transaction(date, 'Account 2', 'Credit', 'benchmark', False, Decimal('-3.00'), [(Decimal('-1.00'), 'Category 1')] * 3), range(inserts)),
+        }
+        db.con.commit()
+        db.con.close()
+
+    print(f"{'insert':<45}{'us per call':>14}")
+    for name, value in results.items():
+        print(f'{name:<45}{value:>14.1f}')
+
+def run_sessions(db_file: Path, sessions: int, transactions: int, timeout: float, write_queue: WriteQueue = None) -> dict:
+    """ Sessions on their own threads all entering transactions at once """
+    dbs = []
+    for _ in range(sessions):
+        db = DbAccess(db_file, run_migrations=False, timeout=timeout, check_same_thread=False, write_queue=write_queue)
+        configure_connection(db.con)
+        dbs.append(db)
+    start_line = threading.Barrier(sessions)
+    date = pd.to_datetime('2020-01-01')
+    counts = {'committed': 0, 'lock_errors': 0, 'other_errors': 0}
+    counts_lock = threading.Lock()
+
+    def session(db: DbAccess, number: int):
+        start_line.wait()
+        for i in range(transactions):
+            try:
+                # Read then write in one transaction, as the assignment pages do
+                with db.transaction():
+                    db.get_accounts()
+                    db.add_transaction(date, 'Account 2', 'Credit', f'session {number} #{i}', False, Decimal('-3.00'), [(Decimal('-1.00'), 'Category 1')] * 3)
+                    db.add_statement_transaction(date, 1, 2020, 2, Decimal('-3.00'), description=f'session {number} #{i}')
+                outcome = 'committed'
+            except sqlite3.OperationalError as error:
+                outcome = 'lock_errors' if 'locked' in str(error) else 'other_errors'
+            except Exception:
+                outcome = 'other_errors'
+            with counts_lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=session, args=(db, number)) for number, db in enumerate(dbs)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for db in dbs:
+        db.con.close()
+    counts['seconds'] = elapsed
+    counts['per_second'] = counts['committed'] / elapsed
+    return counts
+
+def benchmark_writers(sessions: int, transactions: int):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for number, (mode, queued, timeout) in enumerate(WRITER_MODES):
+            db_file = Path(temp_dir) / f'writers{number}.db'
+            build_ledger(db_file, WRITERS_LEDGER_SIZE)
+            migrate(sqlite3.connect(db_file))
+            write_queue = None
+            if queued:
+                write_queue = WriteQueue(db_file, timeout=timeout)
+            results[mode] = run_sessions(db_file, sessions, transactions, timeout, write_queue=write_queue)
+            if write_queue is not None:
+                results[mode]['batches'] = write_queue.stats()['batches']
+            con = sqlite3.connect(db_file)
+            results[mode]['rows_written'] = con.execute("SELECT COUNT(*) FROM statement_transactions WHERE description LIKE 'session %'").fetchone()[0]
+            con.close()
+
+    print(f'{sessions} sessions x {transactions} transactions of 1 taction, 3 subs and 1 statement entry')
+    print(f"{'mode':<25}{'committed':>11}{'lock errors':>13}{'other errors':>14}{'rows':>8}{'batches':>9}{'per second':>12}")
+    for mode, counts in results.items():
+        print(f"{mode:<25}{counts['committed']:>11}{counts['lock_errors']:>13}{counts['other_errors']:>14}{counts['rows_written']:>8}{counts.get('batches', '-'):>9}{counts['per_second']:>12.1f}")
+
+def dense_word_features(statement_df: pd.DataFrame, words: list) -> pd.DataFrame:
+    """ Features as train_model built them before StatementFeaturizer """
+    features = statement_df[NUMERIC_COLUMNS].astype('float64')
+    with warnings.catch_warnings():
+        # Fragmented frame warnings, the cost being measured
+        warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+        for word in words:
+            features[f'{word}_present'] = statement_df['description'].str.contains(word)
+    return features
+
+def time_features(featurize, scaler, statement_data: pd.DataFrame, categories: pd.Series, entries: list) -> dict:
+    """ Featurize, scale and fit the training set, then predict entries one at a time """
+    from sklearn.svm import SVC
+
+    start = time.perf_counter()
+    features = scaler.fit_transform(featurize(statement_data))
+    featurize_ms = (time.perf_counter() - start) * 1000.0
+    start = time.perf_counter()
+    model = SVC().fit(features, categories.to_numpy())
+    fit_ms = (time.perf_counter() - start) * 1000.0
+    start = time.perf_counter()
+    for entry in entries:
+        model.predict(scaler.transform(featurize(pd.DataFrame([entry]))))
+    predict_ms = (time.perf_counter() - start) * 1000.0 / len(entries)
+
+    if hasattr(features, 'nnz'):
+        features_mb = (features.data.nbytes + features.indices.nbytes + features.indptr.nbytes) / 1e6
+    else:
+        features_mb = features.nbytes / 1e6
+    # Measured on its own, tracemalloc slows everything it watches
+    tracemalloc.start()
+    scaler.fit_transform(featurize(statement_data))
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return {
+        'featurize ms': featurize_ms,
+        'fit ms': fit_ms,
+        'predict ms': predict_ms,
+        'features MB': features_mb,
+        'peak MB': peak_mb,
+    }
+
+def benchmark_features(tactions: int, vocabulary_sizes: list = FEATURE_VOCABULARY_SIZES):
+    from sklearn.preprocessing import StandardScaler
+    from ml_statement import training_data
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        build_ledger(db_file, tactions)
+        db = DbAccess(db_file)
+        statement_transactions = db.get_statement_transactions()
+        statement_data, categories = training_data(db)
+        entries = statement_transactions.head(25).to_dict(orient='records')
+        db.con.close()
+
+    results = {}
+    for vocabulary_size in vocabulary_sizes:
+        featurizer = StatementFeaturizer(vocabulary_size=vocabulary_size).fit(statement_transactions['description'])
+        words = featurizer.words
+        results[(len(words), 'str.contains')] = time_features(
+            lambda frame: dense_word_features(frame, words), StandardScaler(), statement_data, categories, entries,
+        )
+        results[(len(words), 'sparse')] = time_features(
+            featurizer.transform, StandardScaler(with_mean=False), statement_data, categories, entries,
+        )
+
+    print(f'{len(statement_data)} training entries, predict ms is per entry')
+    print(f"{'words':>6}  {'features':<14}" + ''.join(f'{measure:>14}' for measure in results[next(iter(results))]))
+    for (words, mode), measures in results.items():
+        print(f'{words:>6}  {mode:<14}' + ''.join(f'{value:>14.1f}' for value in measures.values()))
+
+def sum_amount(df: pd.DataFrame) -> Decimal:
+    """ Per-taction Decimal total, as build_views added them before summing cents """
+    total = Decimal('0.00')
+    for item in df['amount'].values:
+        total += item
+    return total
+
+def benchmark_views(tactions: int, touched: int = 20):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        build_ledger(db_file, tactions)
+        # Migrated for the id sequences the legacy writes allocate from
+        DbAccess(db_file).con.close()
+        decimal_db = db_access.DbAccess(db_file)
+        cents_db = db_access.DbAccess(db_file, integer_cents=True)
+        decimal_db.load_data()
+        cents_db.load_data()
+
+        results = {
+            'Decimal totals, groupby().apply': time_call(lambda: decimal_db.subs.groupby('taction_id').apply(sum_amount), repeats=1),
+            'Decimal totals, int64 cents': time_call(lambda: decimal_db._taction_totals(decimal_db.subs)),
+            'Decimal full build_views': time_call(decimal_db.build_views),
+            'cents full build_views': time_call(cents_db.build_views),
+        }
+        date = pd.to_datetime('2021-06-01')
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(touched):
+                decimal_db.add_transaction(date, 'Account 2', 'Credit', 'benchmark', False, Decimal('-3.00'), [(Decimal('-1.00'), 'Category 1')] * 3)
+            decimal_db.delete_transaction(int(decimal_db.tactions.loc[decimal_db.tactions['valid'] == 1, 'id'].iloc[0]))
+        stale = len(decimal_db.stale_tactions)
+        start = time.perf_counter()
+        incremental = {name: view.copy() for name, view in [('transactions', decimal_db.transactions), ('subview', decimal_db.subview)]}
+        results[f'incremental, {stale} touched tactions'] = (time.perf_counter() - start) * 1000.0
+        decimal_db.build_views()
+        matches = all(incremental[name].equals(decimal_db.views[name]) for name in incremental)
+        rows = (len(decimal_db.tactions), len(decimal_db.subs))
+        decimal_db.con.close()
+        cents_db.con.close()
+
+    print(f'{rows[0]} tactions, {rows[1]} subs')
+    for name, ms in results.items():
+        print(f'{name:<40}{ms:>12.1f} ms')
+    print(f"Incremental views {'match' if matches else 'DIFFER FROM'} a full build")
+
+class QuietPage(object):
+    """ Takes the place of the streamlit module when timing page flows """
+
+    def __getattr__(self, name):
+        return self.ignore
+
+    def ignore(self, *args, **kwargs):
+        return None
+
+class Rollback(Exception):
+    pass
+
+@contextlib.contextmanager
+def rolled_back(db: DbAccess):
+    """ Run writes in a transaction that is always rolled back """
+    try:
+        with db.transaction():
+            yield
+            raise Rollback()
+    except Rollback:
+        pass
+
+def get_method_shapes(db: DbAccess) -> dict:
+    shapes = get_query_shapes(db)
+    shapes.update({
+        'get_transactions()': lambda: db.get_transactions(),
+        'get_subtotals()': lambda: db.get_subtotals(),
+        'get_statement_transactions()': lambda: db.get_statement_transactions(),
+        'get_statement_transactions(unassigned)': lambda: db.get_statement_transactions(include_assigned=False, include_deferred=False),
+        'get_tactions(description_text)': lambda: db.get_tactions(description_text='KROGER #12'),
+        'search_tactions(text)': lambda: db.search_tactions('KROGER #12'),
+    })
+    return shapes
+
+def import_statement_lines(db: DbAccess, lines: list):
+    """ The duplicate check and inserts of the statement entry page """
+    current_statements = db.get_statement_transactions()
+    with db.transaction():
+        for line in lines:
+            duplicates = current_statements.loc[
+                (current_statements['date'] == line['date']) &
+                (current_statements['account_id'] == line['account_id']) &
+                (current_statements['amount'] == line['amount']) &
+                (current_statements['description'] == line['description'])
+            ]
+            if len(duplicates) == 0:
+                db.add_statement_transaction(line['date'], 1, 2022, line['account_id'], line['amount'], description=line['description'])
+
+def time_flow(func) -> float:
+    """ Milliseconds for one run of a flow whose writes are rolled back """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    return (time.perf_counter() - start) * 1000.0
+
+def benchmark_flows(db: DbAccess, db_file: Path, tactions: int, temp_dir: str) -> tuple:
+    flows = {}
+    skipped = {}
+    date = pd.to_datetime('2022-01-03')
+    lines = [
+        {'date': date, 'account_id': i % 5, 'amount': Decimal(f'-{i + 1}.25'), 'description': f'IMPORTED #{i}'}
+        for i in range(500)
+    ]
+    with rolled_back(db):
+        flows['statement import (500 lines)'] = time_flow(lambda: import_statement_lines(db, lines))
+    with rolled_back(db):
+        flows['add_transaction x100'] = time_flow(lambda: [
+            db.add_transaction(date, 'Account 2', 'Credit', 'benchmark', False, Decimal('-3.00'), [(Decimal('-1.00'), 'Category 1')] * 3)
+            for _ in range(100)
+        ])
+
+    try:
+        from auto_assign import auto_assign
+    except ImportError as error:
+        skipped['auto_assign(200 entries)'] = str(error)
+    else:
+        entries = db.get_statement_transactions(include_assigned=False, include_deferred=False).head(200).to_dict(orient='records')
+        with rolled_back(db):
+            flows['auto_assign(200 entries)'] = time_flow(lambda: auto_assign(QuietPage(), db, entries))
+
+    if tactions > TRAIN_MODEL_LIMIT:
+        skipped['train_model'] = f'above TRAIN_MODEL_LIMIT of {TRAIN_MODEL_LIMIT} tactions'
+    else:
+        # train_model saves its model files to the working directory
+        working_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            from ml_statement import train_model
+            flows['train_model'] = time_flow(lambda: train_model(db))
+        finally:
+            os.chdir(working_dir)
+    return flows, skipped
+
+def benchmark_size(tactions: int) -> dict:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / 'synthetic.db'
+        print(f'Building synthetic ledger with {tactions} tactions...')
+        start = time.perf_counter()
+        build_ledger(db_file, tactions)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        db = DbAccess(db_file, cache_size=0)
+        migrate_s = time.perf_counter() - start
+        rows = {
+            table: db.con.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ['taction', 'sub', 'statement_transactions', 'hsa_distributions']
+        }
+        print('Timing DbAccess methods...')
+        methods = {name: time_call(func, repeats=3) for name, func in get_method_shapes(db).items()}
+        print('Timing flows...')
+        flows, skipped = benchmark_flows(db, db_file, tactions, temp_dir)
+        file_mb = db_file.stat().st_size / 1e6
+        db.con.close()
+    return {
+        'build_s': build_s,
+        'migrate_s': migrate_s,
+        'file_mb': file_mb,
+        'rows': rows,
+        'methods_ms': methods,
+        'flows_ms': flows,
+        'skipped': skipped,
+    }
+
+def benchmark_suite(sizes: list, output: Path):
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'sizes': {},
+    }
+    for tactions in sizes:
+        results['sizes'][str(tactions)] = benchmark_size(tactions)
+        # Written after every size so a long run keeps what it finished
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    names = list(results['sizes'][str(sizes[0])]['methods_ms']) + list(results['sizes'][str(sizes[0])]['flows_ms'])
+    print(f"{'ms':<45}" + ''.join(f'{tactions:>12}' for tactions in sizes))
+    for name in names:
+        values = []
+        for tactions in sizes:
+            size_results = results['sizes'][str(tactions)]
+            value = size_results['methods_ms'].get(name, size_results['flows_ms'].get(name))
+            values.append('-' if value is None else f'{value:.1f}')
+        print(f'{name:<45}' + ''.join(f'{value:>12}' for value in values))
+    print(f'Results written to {output}')
+
+if __name__ == '__main__':
+    action = sys.argv[1]
+    if action == 'migrations':
+        if len(sys.argv) > 2:
+            tactions = int(sys.argv[2])
+        else:
+            tactions = 200000
+        benchmark_migrations(tactions)
+    elif action == 'queries':
+        if len(sys.argv) > 2:
+            tactions = int(sys.argv[2])
+        else:
+            tactions = 200000
+        benchmark_queries(tactions)
+    elif action == 'money':
+        if len(sys.argv) > 2:
+            tactions = int(sys.argv[2])
+        else:
+            tactions = 640000
+        benchmark_money(tactions)
+    elif action == 'inserts':
+        if len(sys.argv) > 2:
+            tactions = int(sys.argv[2])
+        else:
+            tactions = 200000
+        benchmark_inserts(tactions)
+    elif action == 'writers':
+        if len(sys.argv) > 2:
+            sessions = int(sys.argv[2])
+        else:
+            sessions = 16
+        if len(sys.argv) > 3:
+            transactions = int(sys.argv[3])
+        else:
+            transactions = 25
+        benchmark_writers(sessions, transactions)
+    elif action == 'features':
+        if len(sys.argv) > 2:
+            tactions = int(sys.argv[2])
+        else:
+            tactions = TRAIN_MODEL_LIMIT
+        benchmark_features(tactions)
+    elif action == 'views':
+        if len(sys.argv) > 2:
+            tactions = int(sys.argv[2])
+        else:
+            tactions = 100000
+        benchmark_views(tactions)
+    elif action == 'suite':
+        if len(sys.argv) > 2:
+            sizes = [int(size) for size in sys.argv[2].split(',')]
+        else:
+            sizes = SUITE_SIZES
+        if len(sys.argv) > 3:
+            output = Path(sys.argv[3])
+        else:
+            output = Path('benchmark_results.json')
+        benchmark_suite(sizes, output)
+    else:
+        print(f'Unknown benchmark {action}')
@@ -0,0 +1,12 @@
+""" Shared test fixtures """
+
+import pytest
+
+from synthetic_ledger import build_ledger
+
+@pytest.fixture
+def db_file(tmp_path):
+    """ A small synthetic ledger """
+    db_file = tmp_path / 'test.db'
+    build_ledger(db_file, 200)
+    return db_file
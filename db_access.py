@@ -7,118 +7,273 @@ import sqlite3
 import pandas as pd
 import numpy as np
 
-def sum_amount(df):
-    total = Decimal('0.00')
-    for item in df['amount'].values:
-        total += item
-    return total
+from money import from_cents, is_cents, cents_from_amounts, amounts_to_decimal
+from snapshot_cache import SnapshotCache
+
+MONEY_FIELDS = ['amount', 'balance', 'increment']
+
+# Money and parsed date columns of each table held in memory
+TABLES = {
+    'account': (['balance'], None),
+    'sub': (['amount'], None),
+    'taction': ([], None),
+    'method': ([], None),
+    'category': ([], None),
+    'budget': (['balance'], None),
+    'statement_transactions': (['amount'], ['date']),
+}
+# Columns the views read through the id/name maps, other columns of these
+# tables (balances) can change without touching the views
+VIEW_MAP_COLUMNS = {
+    'account': ['id', 'name'],
+    'method': ['id', 'name'],
+    'category': ['id', 'budget_id'],
+    'budget': ['id', 'name'],
+}
+
+def sort_view(view: pd.DataFrame, id_columns: list, rows: np.ndarray = None) -> pd.DataFrame:
+    """ rows of view (all by default) newest date first, ties by id_columns
+
+    Ties are ordered so a partial rebuild matches a full one.
+    """
+    if rows is None:
+        rows = np.arange(len(view))
+    dates = view['date'].to_numpy()[rows]
+    # Undated rows go last, as sort_values would put them
+    newest_first = np.where(np.isnat(dates), np.iinfo(np.int64).max, -dates.view('int64'))
+    order = np.lexsort([view[column].to_numpy()[rows] for column in reversed(id_columns)] + [newest_first])
+    return view.take(rows[order])
 
 class DbAccess(object):
+    """ In-memory copy of the database
 
-    def __init__(self, path_to_database: Path):
-        self.con = sqlite3.connect(path_to_database)
-        self.cursor = self.con.cursor()
-        self.load_data()
-        self.build_maps()
-        self.build_views()
-
-    # defining a decorator
+    Tables, id/name maps and the transactions/subview views load on first
+    use.  Writes go to SQLite and then patch the loaded tables with the
+    rows as SQLite now has them, so the copy stays current without a reload.
+    """
 
-    def refresh(func):
-    
-        def inner1(self, *args, **kwargs):            
-            func(self, *args, **kwargs)
-            #self.load_data()
-            #self.build_maps()
-            #self.build_views()
-          
-        return inner1
+    def __init__(self, path_to_database: Path, integer_cents: bool = False, timeout: float = 5.0, check_same_thread: bool = True, snapshot_dir: Path = None):
+        self.con = sqlite3.connect(path_to_database, timeout=timeout, check_same_thread=check_same_thread)
+        self.cursor = self.con.cursor()
+        # Amounts are held as int64 cents instead of Decimal, and integer
+        # amount arguments are read as cents
+        self.integer_cents = integer_cents
+        # Tables unchanged since the last load come from on-disk snapshots
+        if snapshot_dir is None:
+            self.snapshots = None
+        else:
+            self.snapshots = SnapshotCache(snapshot_dir)
+        self.unload()
+
+    def unload(self):
+        """ Forget everything loaded, it is read again on next use """
+        # Taken first so a write landing mid-load triggers another reload
+        self.loaded_state = self.get_data_state()
+        self.tables = {}
+        self.maps = {}
+        self.views = None
+        self.stale_tactions = set()
 
     def get_data(self, table_name: str) -> pd.DataFrame:
-        if table_name == 'account':
-            return self.accounts
-        elif table_name == 'sub':
-            return self.subs
-        elif table_name == 'taction':
-            return self.tactions
-        elif table_name == 'method':
-            return self.methods
-        elif table_name == 'category':
-            return self.categories
-        elif table_name == 'budget':
-            return self.budgets
-        elif table_name == 'statement_transactions':
-            return self.statement_transactions
+        if table_name in TABLES:
+            return self.get_table(table_name)
         else:
             return None
 
-    def load_data(self):
-        self.accounts = pd.read_sql_query(
-            'SELECT * FROM account',
-            self.con,
-            dtype={'balance': str},
-        )
-        self.accounts['balance'] = self.accounts['balance'].apply(Decimal)
-        self.subs = pd.read_sql_query(
-            'SELECT * FROM sub',
+    def get_table(self, table_name: str) -> pd.DataFrame:
+        if table_name not in self.tables:
+            money_columns, parse_dates = TABLES[table_name]
+            self.tables[table_name] = self._finish_table(table_name, self._read_table(table_name, money_columns, parse_dates=parse_dates))
+        return self.tables[table_name]
+
+    def _finish_table(self, table_name: str, data: pd.DataFrame) -> pd.DataFrame:
+        if table_name == 'taction':
+            data['date'] = pd.to_datetime(data['date'])
+        return data
+
+    @property
+    def accounts(self) -> pd.DataFrame:
+        return self.get_table('account')
+
+    @property
+    def subs(self) -> pd.DataFrame:
+        return self.get_table('sub')
+
+    @property
+    def tactions(self) -> pd.DataFrame:
+        return self.get_table('taction')
+
+    @property
+    def methods(self) -> pd.DataFrame:
+        return self.get_table('method')
+
+    @property
+    def categories(self) -> pd.DataFrame:
+        return self.get_table('category')
+
+    @property
+    def budgets(self) -> pd.DataFrame:
+        return self.get_table('budget')
+
+    @property
+    def statement_transactions(self) -> pd.DataFrame:
+        return self.get_table('statement_transactions')
+
+    def _convert_money(self, data: pd.DataFrame, money_columns: list) -> pd.DataFrame:
+        for column_name in money_columns:
+            if self.integer_cents:
+                data[column_name] = cents_from_amounts(data[column_name])
+            else:
+                data[column_name] = data[column_name].astype(str).apply(Decimal)
+        return data
+
+    def _read_money(self, sql: str, money_columns: list, parse_dates: list = None, params: list = None) -> pd.DataFrame:
+        data = pd.read_sql_query(
+            sql,
             self.con,
-            dtype={'amount': str},
+            params=params,
+            parse_dates=parse_dates,
         )
-        self.subs['amount'] = self.subs['amount'].apply(Decimal)
-        self.tactions = pd.read_sql_query(
-            'SELECT * FROM taction',
-            self.con
-        )
-        self.tactions['date'] = pd.to_datetime(self.tactions['date'])
-        self.methods = pd.read_sql_query(
-            'SELECT * from method',
-            self.con
-        )
-        self.categories = pd.read_sql_query(
-            'SELECT * FROM category',
-            self.con
-        )
-        self.budgets = pd.read_sql_query(
-            'SELECT * FROM budget',
-            self.con,
-            dtype={'balance': str},
-        )
-        self.budgets['balance'] = self.budgets['balance'].apply(Decimal)
-        self.statement_transactions = pd.read_sql_query(
-            'SELECT * FROM statement_transactions',
-            self.con,
-            parse_dates=['date'],
-            dtype={'amount': str},
-        )
-        self.statement_transactions['amount'] = self.statement_transactions['amount'].apply(Decimal)
+        return self._convert_money(data, money_columns)
+
+    def _read_table(self, table: str, money_columns: list, parse_dates: list = None) -> pd.DataFrame:
+        """ Every row of table, from its snapshot when nothing changed """
+        sql = f'SELECT * FROM {table}'
+        if self.snapshots is None:
+            return self._read_money(sql, money_columns, parse_dates=parse_dates)
+        data = self.snapshots.read_table(self.con, table, lambda: pd.read_sql_query(sql, self.con, parse_dates=parse_dates))
+        return self._convert_money(data, money_columns)
+
+    def _to_amount(self, value):
+        """ Decimal for SQL from an amount argument in either mode """
+        if self.integer_cents and is_cents(value):
+            return from_cents(value)
+        return value
+
+    def get_data_state(self) -> tuple:
+        """ Changes when any connection commits or this one writes """
+        return (self.con.execute('PRAGMA data_version').fetchone()[0], self.con.total_changes)
+
+    def reload_if_changed(self):
+        """ Drop what was loaded if another connection wrote since """
+        if self.get_data_state() != self.loaded_state:
+            self.unload()
 
-        self.max_taction_id = max(self.tactions['id'])
-        self.max_sub_id = max(self.subs['id'])
-        if len(self.statement_transactions) > 0:
-            self.max_statement_transactions_id = max(self.statement_transactions['id'])
-        else:
-            self.max_statement_transactions_id = -1
+    def load_data(self):
+        for table_name in TABLES:
+            self.get_table(table_name)
+
+    def get_map(self, table_name: str, key: str, value: str) -> dict:
+        if (table_name, key, value) not in self.maps:
+            data = self.get_table(table_name)
+            self.maps[(table_name, key, value)] = dict(zip(data[key].tolist(), data[value].tolist()))
+        return self.maps[(table_name, key, value)]
+
+    @property
+    def method_map(self) -> dict:
+        return self.get_map('method', 'id', 'name')
+
+    @property
+    def method_map_reverse(self) -> dict:
+        return self.get_map('method', 'name', 'id')
+
+    @property
+    def category_map(self) -> dict:
+        return self.get_map('category', 'id', 'name')
+
+    @property
+    def category_map_reverse(self) -> dict:
+        return self.get_map('category', 'name', 'id')
+
+    @property
+    def account_map(self) -> dict:
+        return self.get_map('account', 'id', 'name')
+
+    @property
+    def account_map_reverse(self) -> dict:
+        return self.get_map('account', 'name', 'id')
+
+    @property
+    def budget_map(self) -> dict:
+        return self.get_map('budget', 'id', 'name')
+
+    @property
+    def budget_map_reverse(self) -> dict:
+        return self.get_map('budget', 'name', 'id')
+
+    @property
+    def category_to_budget_map(self) -> dict:
+        return self.get_map('category', 'id', 'budget_id')
 
     def build_maps(self):
-        self.method_map = {item['id']: item['name'] for item in self.methods.to_dict(orient='records')}
-        self.method_map_reverse = {item['name']: item['id'] for item in self.methods.to_dict(orient='records')}
-        self.category_map = {item['id']: item['name'] for item in self.categories.to_dict(orient='records')}
-        self.category_map_reverse = {item['name']: item['id'] for item in self.categories.to_dict(orient='records')}
-        self.account_map = {item['id']: item['name'] for item in self.accounts.to_dict(orient='records')}
-        self.account_map_reverse = {item['name']: item['id'] for item in self.accounts.to_dict(orient='records')}
-        self.budget_map = {item['id']: item['name'] for item in self.budgets.to_dict(orient='records')}
-        self.budget_map_reverse = {item['name']: item['id'] for item in self.budgets.to_dict(orient='records')}
-        self.category_to_budget_map = {item['id']: item['budget_id'] for item in self.categories.to_dict(orient='records')}
-
-    def build_views(self):
-        sub_totals = self.subs.groupby('taction_id').apply(sum_amount).reset_index(drop=False).rename({0:'amount'}, axis='columns')
-        self.transactions = sub_totals.join(self.tactions.set_index('id', drop=False), on='taction_id', lsuffix='_sub').reset_index().sort_values(by=['date'], ascending=False)
-        self.transactions['method'] = self.transactions['method_id'].map(self.method_map)
-        self.transactions['account'] = self.transactions['account_id'].map(self.account_map)
-        
-        self.subview = self.subs.join(self.tactions.set_index('id', drop=False), on='taction_id', lsuffix='_sub').reset_index().sort_values(by=['date'], ascending=False)
-        self.subview['budget_id'] = self.subview['category_id'].map(self.category_to_budget_map)
-        self.subview['budget'] = self.subview['budget_id'].map(self.budget_map)
+        self.maps = {}
+
+    @property
+    def transactions(self) -> pd.DataFrame:
+        self._refresh_views()
+        return self.views['transactions']
+
+    @property
+    def subview(self) -> pd.DataFrame:
+        self._refresh_views()
+        return self.views['subview']
+
+    def _refresh_views(self):
+        if self.views is None:
+            self.build_views()
+        elif len(self.stale_tactions) > 0:
+            self.build_views(self.stale_tactions)
+
+    def _taction_totals(self, subs: pd.DataFrame) -> pd.DataFrame:
+        """ Sub amounts summed per taction_id, Decimal amounts summed as int64 cents """
+        if self.integer_cents:
+            totals = subs.groupby('taction_id')['amount'].sum()
+        else:
+            cents = cents_from_amounts(subs['amount']).groupby(subs['taction_id']).sum()
+            totals = amounts_to_decimal(cents).rename('amount')
+        return totals.reset_index(drop=False)
+
+    def _build_transactions(self, subs: pd.DataFrame) -> pd.DataFrame:
+        transactions = self._taction_totals(subs).join(self.tactions.set_index('id', drop=False), on='taction_id', lsuffix='_sub')
+        transactions['method'] = transactions['method_id'].map(self.method_map)
+        transactions['account'] = transactions['account_id'].map(self.account_map)
+        return transactions
+
+    def _build_subview(self, subs: pd.DataFrame) -> pd.DataFrame:
+        subview = subs.join(self.tactions.set_index('id', drop=False), on='taction_id', lsuffix='_sub')
+        subview['budget_id'] = subview['category_id'].map(self.category_to_budget_map)
+        subview['budget'] = subview['budget_id'].map(self.budget_map)
+        return subview
+
+    def build_views(self, taction_ids: set = None):
+        """ Build transactions and subview, only the rows of taction_ids when given """
+        if taction_ids is None or self.views is None:
+            transactions = sort_view(self._build_transactions(self.subs).reset_index(), ['taction_id'])
+            subview = sort_view(self._build_subview(self.subs).reset_index(), ['taction_id', 'id_sub'])
+        else:
+            taction_ids = list(taction_ids)
+            subs = self.subs.loc[self.subs['taction_id'].isin(taction_ids)]
+            old_transactions = self.views['transactions']
+            replaced = old_transactions['taction_id'].isin(taction_ids)
+            # Rebuilt tactions keep their row labels, new ones go at the end
+            fresh = self._build_transactions(subs)
+            labels = fresh['taction_id'].map(pd.Series(old_transactions.index[replaced], index=old_transactions.loc[replaced, 'taction_id']))
+            next_label = old_transactions.index.max() + 1 if len(old_transactions) > 0 else 0
+            new_labels = labels.isna()
+            labels[new_labels] = range(next_label, next_label + new_labels.sum())
+            fresh.index = labels.astype('int64').values
+            transactions = self._replace_view_rows(old_transactions, replaced, fresh.reset_index(), ['taction_id'])
+            old_subview = self.views['subview']
+            replaced = old_subview['taction_id'].isin(taction_ids)
+            subview = self._replace_view_rows(old_subview, replaced, self._build_subview(subs).reset_index(), ['taction_id', 'id_sub'])
+        self.views = {'transactions': transactions, 'subview': subview}
+        self.stale_tactions = set()
+
+    def _replace_view_rows(self, view: pd.DataFrame, replaced: pd.Series, fresh: pd.DataFrame, id_columns: list) -> pd.DataFrame:
+        """ view without the replaced rows plus fresh, labelled by its index column, sorted again """
+        fresh.index = fresh['index'].values
+        keep = np.concatenate([~replaced.to_numpy(), np.ones(len(fresh), dtype=bool)])
+        return sort_view(pd.concat([view, fresh]), id_columns, rows=np.flatnonzero(keep))
 
     def delete_transaction(self, transaction_id: int):
         statements = self.statement_transactions.loc[
@@ -131,7 +286,7 @@ class DbAccess(object):
         for sub in subs.to_dict(orient='records'):
             if sub['valid'] != 1:
                 raise ValueError('Sub was not valid')
-            sub_amount = sub['amount']
+            sub_amount = self._to_amount(sub['amount'])
             amount += sub_amount
             self.update_budget(Decimal('-1.00')*sub_amount, sub['category_id'])
             self._update(
@@ -147,7 +302,7 @@ class DbAccess(object):
         )
 
     def add_transfer(self, date, withdrawal_account: str, deposit_account: str, description, receipt, amount: Decimal):
-        withdraw_amount = Decimal('-1.00') * amount
+        withdraw_amount = -amount
         self.add_transaction(
             date,
             withdrawal_account,
@@ -218,13 +373,73 @@ class DbAccess(object):
             entry_id,
         )
 
-    @refresh
+    def _write_through(self, table_name: str, state_before: tuple, rowid: int = None, item_id: int = None):
+        """ Patch the loaded copy of table_name after a committed write
+
+        The written row is read back, so defaults, column affinity and the
+        money and date conversions match a full load.  rowid is an inserted
+        row, item_id an updated one.
+        """
+        state_after = self.get_data_state()
+        if state_before == self.loaded_state and state_after[0] == state_before[0]:
+            # Nobody else committed in between, the patch below covers it all
+            self.loaded_state = state_after
+        self.maps = {key: value for key, value in self.maps.items() if key[0] != table_name}
+        if table_name not in self.tables:
+            if table_name in VIEW_MAP_COLUMNS or table_name in ['sub', 'taction']:
+                self.views = None
+            return
+        money_columns, parse_dates = TABLES[table_name]
+        if rowid is not None:
+            where_sql, params = 'rowid = ?', [rowid]
+        else:
+            where_sql, params = 'id = ?', [item_id]
+        fresh = self._finish_table(table_name, self._read_money(f'SELECT * FROM {table_name} WHERE {where_sql}', money_columns, parse_dates=parse_dates, params=params))
+        data = self.tables[table_name]
+        for column_name, dtype in data.dtypes.items():
+            if column_name in fresh.columns and fresh[column_name].dtype != dtype:
+                try:
+                    fresh[column_name] = fresh[column_name].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        if rowid is not None:
+            next_label = data.index.max() + 1 if len(data) > 0 else 0
+            fresh.index = range(next_label, next_label + len(fresh))
+            old = data.iloc[0:0]
+            self.tables[table_name] = pd.concat([data, fresh])
+        else:
+            replaced = data.index[data['id'] == item_id]
+            if len(replaced) != len(fresh):
+                # Duplicate ids cannot be matched row for row
+                self.tables.pop(table_name)
+                self.views = None
+                return
+            fresh.index = replaced
+            old = data.loc[replaced]
+            self.tables[table_name] = pd.concat([data.drop(replaced), fresh]).sort_index()
+        self._mark_views(table_name, old, fresh)
+
+    def _mark_views(self, table_name: str, old: pd.DataFrame, fresh: pd.DataFrame):
+        """ Note which view rows a write to table_name made stale """
+        if self.views is None:
+            return
+        if table_name == 'sub':
+            self.stale_tactions.update(pd.concat([old['taction_id'], fresh['taction_id']]).dropna().tolist())
+        elif table_name == 'taction':
+            self.stale_tactions.update(fresh['id'].tolist())
+        elif table_name in VIEW_MAP_COLUMNS and len(old) > 0:
+            columns = VIEW_MAP_COLUMNS[table_name]
+            if not old[columns].equals(fresh[columns]):
+                self.views = None
+
     def _update_add(self, table_name: str, field_name: str, amount: Decimal, item_id: int):
-        self.cursor.execute(f"UPDATE {table_name} SET {field_name}={field_name}+{amount} WHERE id={item_id}")
+        state_before = self.get_data_state()
+        self.cursor.execute(f"UPDATE {table_name} SET {field_name}={field_name}+{self._to_amount(amount)} WHERE id={item_id}")
         self.con.commit()
+        self._write_through(table_name, state_before, item_id=item_id)
 
-    @refresh
     def _update(self, table_name: str, field_name: str, in_new_value, item_id: int, use_quotes: bool = False):
+        state_before = self.get_data_state()
         if use_quotes:
             new_value = f"'{in_new_value}'"
         else:
@@ -234,6 +449,7 @@ class DbAccess(object):
         else:
             self.cursor.execute(f"UPDATE {table_name} SET {field_name}={new_value} WHERE id={item_id}")
         self.con.commit()
+        self._write_through(table_name, state_before, item_id=item_id)
 
     def add_sub(self, amount: Decimal, category_id: int, taction_id: int, valid: bool, not_real: bool):
         fields = [
@@ -265,13 +481,14 @@ class DbAccess(object):
         ])
         return new_id
 
+    def get_next_id(self, table_name: str) -> int:
+        return self.con.execute(f'SELECT IFNULL(MAX(id), -1) + 1 FROM {table_name}').fetchone()[0]
+
     def get_next_taction_id(self):
-        self.max_taction_id += 1
-        return self.max_taction_id
+        return self.get_next_id('taction')
 
     def get_next_sub_id(self):
-        self.max_sub_id += 1
-        return self.max_sub_id
+        return self.get_next_id('sub')
     
     def add_taction(self, date, transfer: bool, account_id: int, method_id: int, description: str, receipt: bool, valid: bool, not_real: bool):
         fields = [
@@ -318,8 +535,7 @@ class DbAccess(object):
         return new_id
 
     def get_next_statement_transaction_id(self):
-        self.max_statement_transactions_id += 1
-        return self.max_statement_transactions_id
+        return self.get_next_id('statement_transactions')
 
     def add_statement_transaction(self, date, month:int, year:int, account_id:int, amount:Decimal, description:str = None):
         fields = [
@@ -344,13 +560,15 @@ class DbAccess(object):
             values.append(description)
         self._insert('statement_transactions', fields, values)
 
-    @refresh
     def _insert(self, table: str, fields: list, values: list):
+        state_before = self.get_data_state()
         fields_str = ', '.join(fields)
+        values = [self._to_amount(value) if field in MONEY_FIELDS else value for field, value in zip(fields, values)]
         str_values = [str(value) for value in values]
         values_str = "\"" + "\", \"".join(str_values) + "\""
         self.cursor.execute(f"INSERT INTO {table} ({fields_str}) VALUES ({values_str})")
         self.con.commit()
+        self._write_through(table, state_before, rowid=self.cursor.lastrowid)
 
     def add_account(self, name: str, balance: Decimal, purpose: str):
         new_id = max(self.accounts['id']) + 1
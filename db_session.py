@@ -0,0 +1,93 @@
+""" Streamlit-scoped DbAccess objects
+
+Streamlit reruns the whole script on every interaction.  Keeping the
+DbAccess objects in st.session_state lets a rerun reuse the open connection
+and everything already cached on it, so only the page's own queries run.
+
+Each browser session owns its connection, sessions never share one.
+Report pages can use a second DbAccess reading from an in-memory replica
+of the file, see newdb_access.DbAccess.refresh_replica.  Writes from every
+session go through one shared write_queue.WriteQueue per file.
+Streamlit starts a new thread for each run of a session, which is why the
+connections skip sqlite3's same-thread check; a session only ever has one
+run executing at a time.  When the app exits the connections are closed and
+the shared writer checkpoints the WAL back into the file.
+"""
+
+from pathlib import Path
+import atexit
+import weakref
+
+import sqlite3
+
+import db_access
+import newdb_access
+from query_log import QueryLog
+from write_queue import shared_queue
+
+# Seconds a write waits on another session's lock before failing
+BUSY_TIMEOUT = 30.0
+# Session DbAccess objects, closed when the app exits
+_session_dbs = weakref.WeakSet()
+
+def configure_connection(con: sqlite3.Connection):
+    # WAL lets sessions keep reading while another one writes, and NORMAL
+    # sync is still durable against application crashes in WAL mode
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+
+def snapshot_dir(db_file: Path) -> Path:
+    """ Table snapshots live beside the database they were taken from """
+    db_file = Path(db_file)
+    return db_file.parent / f'{db_file.name}.snapshots'
+
+def session_key(kind: str, db_file: Path) -> str:
+    return f'{kind}:{Path(db_file).resolve()}'
+
+def get_db(st, db_file: Path = Path('example.db'), read_replica: bool = False) -> newdb_access.DbAccess:
+    """ The session's DbAccess, created on its first run """
+    if read_replica:
+        key = session_key('newdb_access_replica', db_file)
+    else:
+        key = session_key('newdb_access', db_file)
+    if key not in st.session_state:
+        db = newdb_access.DbAccess(
+            db_file,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+            snapshot_dir=snapshot_dir(db_file),
+            read_replica=read_replica,
+            write_queue=shared_queue(db_file, timeout=BUSY_TIMEOUT),
+        )
+        configure_connection(db.con)
+        _session_dbs.add(db)
+        st.session_state[key] = db
+    return st.session_state[key]
+
+@atexit.register
+def close_session_dbs():
+    """ Close the session connections so the shared writer's checkpoint empties the WAL """
+    for db in list(_session_dbs):
+        db.con.close()
+
+def get_query_log(st, db: newdb_access.DbAccess) -> QueryLog:
+    """ The session's query log, hooked into db """
+    key = 'query_log'
+    if key not in st.session_state:
+        st.session_state[key] = QueryLog()
+    query_log = st.session_state[key]
+    if query_log not in db.query_hooks:
+        db.add_query_hook(query_log)
+    return query_log
+
+def get_legacy_db(st, db_file: Path = Path('example.db')) -> db_access.DbAccess:
+    """ The session's legacy DbAccess, reloaded only after writes """
+    key = session_key('db_access', db_file)
+    if key not in st.session_state:
+        db = db_access.DbAccess(db_file, timeout=BUSY_TIMEOUT, check_same_thread=False, snapshot_dir=snapshot_dir(db_file))
+        configure_connection(db.con)
+        _session_dbs.add(db)
+        st.session_state[key] = db
+    else:
+        st.session_state[key].reload_if_changed()
+    return st.session_state[key]
@@ -0,0 +1,86 @@
+""" Chunked CSV and Parquet downloads
+
+An export is written chunk by chunk from an iterator of frames, such as
+DbAccess.iter_transactions, into a temporary file.  Building one holds a
+single chunk in memory however large the ledger is, and pages only build it
+when the download is asked for instead of on every rerun.  Parquet needs the
+optional pyarrow package and is offered only when it is installed.
+"""
+
+import importlib.util
+import tempfile
+
+# Format name: (file extension, mime type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+# Decimal amounts are written to Parquet as decimal(18, 2)
+PARQUET_DECIMAL_PRECISION = 18
+
+def available_formats() -> list:
+    if importlib.util.find_spec('pyarrow') is None:
+        return ['CSV']
+    return list(EXPORT_FORMATS)
+
+def write_csv(chunks, export_file):
+    """ Same text as to_csv on the whole result, row labels counted across chunks """
+    row_count = 0
+    for chunk in chunks:
+        chunk.index = range(row_count, row_count + len(chunk))
+        export_file.write(chunk.to_csv(header=row_count == 0).encode('utf-8'))
+        row_count += len(chunk)
+
+def write_parquet(chunks, export_file):
+    """ One row group per chunk, the schema taken from the first chunk """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    text_columns = []
+    try:
+        for chunk in chunks:
+            if writer is None:
+                fields = []
+                for field in pa.Schema.from_pandas(chunk, preserve_index=False):
+                    if pa.types.is_null(field.type):
+                        # No values to go by in the first chunk, keep as text
+                        text_columns.append(field.name)
+                        field = field.with_type(pa.string())
+                    elif pa.types.is_decimal(field.type):
+                        field = field.with_type(pa.decimal128(PARQUET_DECIMAL_PRECISION, 2))
+                    fields.append(field)
+                writer = pq.ParquetWriter(export_file, pa.schema(fields))
+            for column_name in text_columns:
+                chunk[column_name] = chunk[column_name].astype('string')
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+WRITERS = {
+    'CSV': write_csv,
+    'Parquet': write_parquet,
+}
+
+def view_export(st, key: str, file_stem: str, get_chunks):
+    """ Download button for get_chunks(), built only when Prepare is pressed
+
+    The export is written to an unnamed temporary file that is gone once
+    the download button has read it.
+    """
+    left, right = st.columns(2)
+    export_format = left.selectbox('Export Format', options=available_formats(), key=f'{key}-format')
+    if not right.button('Prepare Download', key=f'{key}-prepare'):
+        return
+    extension, mime = EXPORT_FORMATS[export_format]
+    with tempfile.TemporaryFile() as export_file:
+        WRITERS[export_format](get_chunks(), export_file)
+        export_file.seek(0)
+        st.download_button(
+            'Press to Download',
+            export_file,
+            f'{file_stem}.{extension}',
+            mime,
+            key=f'{key}-download',
+        )
@@ -0,0 +1,176 @@
+""" Versioned schema migrations """
+
+import datetime
+
+import sqlite3
+
+VERSIONED_TABLES = [
+    'account',
+    'method',
+    'category',
+    'budget',
+    'budget_profile',
+    'budget_adjustments',
+    'taction',
+    'sub',
+    'statement_transactions',
+    'hsa_distributions',
+    'hsa_transactions',
+    'hsa_receipt_paths',
+    'important_dates',
+]
+
+def table_version_statements(tables: list) -> list:
+    """ Triggers counting the writes to each table in table_versions """
+    statements = ['CREATE TABLE IF NOT EXISTS table_versions (name text PRIMARY KEY, version int)']
+    for table in tables:
+        statements.append(f"INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 0)")
+        for event in ['INSERT', 'UPDATE', 'DELETE']:
+            statements.append(
+                f'CREATE TRIGGER IF NOT EXISTS table_version_{table}_{event.lower()} AFTER {event} ON {table} '
+                f"BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END"
+            )
+    return statements
+
+ID_SEQUENCE_TABLES = [
+    'category',
+    'budget',
+    'budget_adjustments',
+    'taction',
+    'sub',
+    'statement_transactions',
+    'hsa_distributions',
+]
+
+def id_sequence_statements(tables: list) -> list:
+    """ Next free id per table, seeded from the rows already there """
+    statements = ['CREATE TABLE IF NOT EXISTS id_sequence (name text PRIMARY KEY, next_id int)']
+    for table in tables:
+        statements.append(
+            f"INSERT OR IGNORE INTO id_sequence (name, next_id) SELECT '{table}', IFNULL(MAX(id) + 1, 0) FROM {table}"
+        )
+    return statements
+
+# Description indexes as (index, table).  The trigram tokenizer matches any
+# substring of three or more characters, the same rows LIKE '%text%' finds.
+DESCRIPTION_INDEXES = [
+    ('taction_fts', 'taction'),
+    ('statement_transactions_fts', 'statement_transactions'),
+]
+
+def description_index_statements(indexes: list) -> list:
+    """ FTS5 indexes over description kept in step with their table """
+    statements = []
+    for index, table in indexes:
+        insert = f'INSERT INTO {index} (rowid, description) VALUES (new.id, new.description);'
+        delete = f"INSERT INTO {index} ({index}, rowid, description) VALUES ('delete', old.id, old.description);"
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(description, content='{table}', content_rowid='id', tokenize='trigram')",
+            f"INSERT INTO {index} ({index}) VALUES ('rebuild')",
+            f'CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+            f'CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF id, description ON {table} BEGIN {delete} {insert} END',
+        ]
+    return statements
+
+LABEL_LOG_INSERT = 'INSERT INTO statement_label_log (statement_id, taction_id) VALUES'
+
+def label_log_sub_update_statement() -> str:
+    # valid and not_real decide whether a sub labels its statement entry
+    log = LABEL_LOG_INSERT
+    return (
+        'CREATE TRIGGER IF NOT EXISTS statement_label_log_sub_update AFTER UPDATE OF taction_id, category_id, valid, not_real ON sub '
+        f'BEGIN {log} (NULL, old.taction_id); {log} (NULL, new.taction_id); END'
+    )
+
+def label_log_statements() -> list:
+    """ Log of writes that can change a statement entry's training label or features
+
+    Rows name the statement entry, or only the taction when one of its subs
+    changed.  seq only grows, so a reader keeps the last seq it has seen.
+    """
+    log = LABEL_LOG_INSERT
+    return [
+        'CREATE TABLE IF NOT EXISTS statement_label_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, statement_id int, taction_id int)',
+        f'CREATE TRIGGER IF NOT EXISTS statement_label_log_insert AFTER INSERT ON statement_transactions WHEN new.taction_id IS NOT NULL BEGIN {log} (new.id, NULL); END',
+        f'CREATE TRIGGER IF NOT EXISTS statement_label_log_update AFTER UPDATE OF taction_id, description, account_id, amount, deferred ON statement_transactions BEGIN {log} (new.id, NULL); END',
+        f'CREATE TRIGGER IF NOT EXISTS statement_label_log_delete AFTER DELETE ON statement_transactions BEGIN {log} (old.id, NULL); END',
+        f'CREATE TRIGGER IF NOT EXISTS statement_label_log_sub_insert AFTER INSERT ON sub BEGIN {log} (NULL, new.taction_id); END',
+        label_log_sub_update_statement(),
+        f'CREATE TRIGGER IF NOT EXISTS statement_label_log_sub_delete AFTER DELETE ON sub BEGIN {log} (NULL, old.taction_id); END',
+    ]
+
+# Each migration is (version, description, statements).  Partial indexes only
+# apply when the query repeats the index WHERE clause literally, so the
+# DbAccess filters keep 'valid = 1' and 'not_real = 0' as constants.
+MIGRATIONS = [
+    (1, 'Indexes for DbAccess filters', [
+        'CREATE INDEX IF NOT EXISTS ix_taction_id ON taction (id)',
+        'CREATE INDEX IF NOT EXISTS ix_taction_valid_date ON taction (date) WHERE valid = 1',
+        'CREATE INDEX IF NOT EXISTS ix_taction_valid_account_date ON taction (account_id, date) WHERE valid = 1',
+        'CREATE INDEX IF NOT EXISTS ix_sub_id ON sub (id)',
+        'CREATE INDEX IF NOT EXISTS ix_sub_taction ON sub (taction_id)',
+        'CREATE INDEX IF NOT EXISTS ix_sub_valid_taction ON sub (taction_id, amount) WHERE valid = 1 AND not_real = 0',
+        'CREATE INDEX IF NOT EXISTS ix_sub_valid_category_date ON sub (category_id, date) WHERE valid = 1 AND not_real = 0',
+        'CREATE INDEX IF NOT EXISTS ix_statement_transactions_id ON statement_transactions (id)',
+        'CREATE INDEX IF NOT EXISTS ix_statement_transactions_taction ON statement_transactions (taction_id)',
+        'CREATE INDEX IF NOT EXISTS ix_statement_transactions_account_date ON statement_transactions (account_id, date)',
+        'CREATE INDEX IF NOT EXISTS ix_hsa_distributions_source ON hsa_distributions (source_id)',
+        'CREATE INDEX IF NOT EXISTS ix_budget_adjustments_budget ON budget_adjustments (budget_id)',
+    ]),
+    (2, 'Per-table write counters', table_version_statements(VERSIONED_TABLES)),
+    (3, 'Id sequences', [
+        'CREATE INDEX IF NOT EXISTS ix_hsa_distributions_id ON hsa_distributions (id)',
+        'CREATE INDEX IF NOT EXISTS ix_budget_adjustments_id ON budget_adjustments (id)',
+    ] + id_sequence_statements(ID_SEQUENCE_TABLES)),
+    (4, 'Description search indexes', description_index_statements(DESCRIPTION_INDEXES)),
+    (5, 'Stored statement predictions', [
+        'CREATE TABLE IF NOT EXISTS statement_predictions (statement_id int, model_hash text, category_id int, confidence real, PRIMARY KEY (statement_id, model_hash))',
+    ] + table_version_statements(['statement_predictions'])),
+    (6, 'Statement label change log', label_log_statements()),
+    (7, 'Statement label log on sub validity', [
+        'DROP TRIGGER IF EXISTS statement_label_log_sub_update',
+        label_log_sub_update_statement(),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(con: sqlite3.Connection) -> int:
+    table = con.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if table is None:
+        return 0
+    version = con.execute('SELECT MAX(version) FROM schema_version').fetchone()[0]
+    if version is None:
+        return 0
+    return version
+
+def migrate(con: sqlite3.Connection) -> int:
+    """ Apply pending migrations and return the schema version """
+    if get_schema_version(con) >= LATEST_VERSION:
+        return LATEST_VERSION
+
+    # Take the write lock before re-reading the version so two sessions
+    # starting at once do not both apply the same migration
+    con.commit()
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        con.execute('CREATE TABLE IF NOT EXISTS schema_version (version int, description text, date date)')
+        version = get_schema_version(con)
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            for statement in statements:
+                con.execute(statement)
+            con.execute(
+                'INSERT INTO schema_version (version, description, date) VALUES (?, ?, ?)',
+                (migration_version, description, str(datetime.datetime.today().date())),
+            )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    con.execute('ANALYZE')
+    return LATEST_VERSION
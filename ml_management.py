@@ -1,12 +1,31 @@
 """ ML Management """
 
 import streamlit as stl
+import pandas as pd
 
 from newdb_access import DbAccess
-from ml_statement import train_model
+import ml_statement
+from ml_statement import train_model, train_online_model
+from model_selection import select_model
 
 def ml_management(st: stl, db: DbAccess):
     st.markdown('ML Management')
     if st.button('Re-Train Suggestions'):
         train_model(db)
-        st.markdown('Retrain Complete!')
\ No newline at end of file
+        st.markdown('Retrain Complete!')
+    if st.button('Search For A Better Model'):
+        report = select_model(db)
+        st.write(pd.DataFrame(report['search']))
+        if report['kept'] and ml_statement.ONLINE_MODEL is not None:
+            st.markdown(f"Saved {report['candidate']['estimator']} {report['candidate']['settings']} as the retrained model, suggestions still come from the online model")
+        elif report['kept']:
+            st.markdown(f"Now using {report['candidate']['estimator']} {report['candidate']['settings']}")
+        else:
+            st.markdown('The current model is still as accurate, or noticeably faster')
+    if st.button('Build Online Suggestions'):
+        train_online_model(db)
+        st.markdown('Online model built!')
+    if ml_statement.ONLINE_MODEL is None:
+        st.markdown('Suggestions come from the last retrain')
+    else:
+        st.markdown('Suggestions come from the online model, which learns each assignment')
@@ -1,112 +1,268 @@
 """ ML statement capes """
 
-import functools
-from functools import lru_cache
+from pathlib import Path
+import copy
+import hashlib
+import os
+import threading
 
 import pandas as pd
 from joblib import dump, load
 from sklearn.preprocessing import StandardScaler
+from sklearn.base import clone
+from sklearn.linear_model import SGDClassifier
 from sklearn.svm import SVC
 import numpy as np
 
 from newdb_access import DbAccess
+from statement_features import hashed_features
+from training_set import load_training_set
 
-SVC_MODEL = load('statement_to_category_model.joblib')
-SCALER = load('statement_scaler.joblib')
-WORD_LIST = load('word_list.joblib')
+def load_if_present(file_name: str):
+    """ Saved model object, or None until train_model has run """
+    if Path(file_name).exists():
+        return load(file_name)
+    return None
 
-def hash_dict(func):
-    """Transform mutable dictionnary
-    Into immutable
-    Useful to be compatible with cache
+SVC_MODEL = load_if_present('statement_to_category_model.joblib')
+SCALER = load_if_present('statement_scaler.joblib')
+FEATURIZER = load_if_present('statement_featurizer.joblib')
+
+# The online model learns each assignment as it is made, and is used for
+# suggestions instead of the SVC once it has been built
+ONLINE_MODEL_FILE = 'statement_online_model.joblib'
+ONLINE_MODEL = load_if_present(ONLINE_MODEL_FILE)
+# Passes over the labeled entries when the online model is built
+ONLINE_EPOCHS = 5
+# Statement ids assigned since the online model last learned.  The hook
+# appending them runs on the write queue's thread.
+PENDING_ASSIGNMENTS = []
+PENDING_LOCK = threading.Lock()
+# Held while the online model is rebuilt or updated.  Updates are made on a
+# copy and swapped in, so predictions never see a half-updated model.
+ONLINE_LOCK = threading.Lock()
+
+# Labeled entries as features, updated in place by each train_model
+TRAINING_SET_FILE = 'statement_training_set.npz'
+
+# Files of the SVC pipeline, hashed to version its stored predictions
+SVC_MODEL_FILES = [
+    'statement_to_category_model.joblib',
+    'statement_scaler.joblib',
+    'statement_featurizer.joblib',
+]
+
+def model_hash() -> str:
+    """ Hash of the saved model predict_categories uses, None without one """
+    if ONLINE_MODEL is not None:
+        files = [ONLINE_MODEL_FILE]
+    elif SVC_MODEL is not None and FEATURIZER is not None:
+        files = SVC_MODEL_FILES
+    else:
+        return None
+    digest = hashlib.sha256()
+    for file_name in files:
+        digest.update(Path(file_name).read_bytes())
+    return digest.hexdigest()[:16]
+
+# Hashed when the model is loaded or saved, not on every page run
+MODEL_HASH = model_hash()
+
+def rank_categories(model, features, top_k: int) -> tuple:
+    """ (categories, scores) of each row's top_k classes by decision score, best first """
+    scores = model.decision_function(features)
+    if scores.ndim == 1:
+        # Two classes, scored for the second one
+        scores = np.column_stack([-scores, scores])
+    ranked = np.argsort(-scores, axis=1, kind='stable')[:, :top_k]
+    return model.classes_[ranked], np.take_along_axis(scores, ranked, axis=1)
+
+def predict_categories(statements_df: pd.DataFrame, top_k: int = None):
+    """ Categories of a batch of statement entries from one model call
+
+    A Series of the predicted category_id indexed like statements_df, or
+    with top_k a frame of each entry's top_k categories, rank 1 first, and
+    their decision scores.
     """
-    class HDict(dict):
-        def __hash__(self):
-            return hash(frozenset(self.items()))
-
-    @functools.wraps(func)
-    def wrapped(*args, **kwargs):
-        args = tuple([HDict(arg) if isinstance(arg, dict) else arg for arg in args])
-        kwargs = {k: HDict(v) if isinstance(v, dict) else v for k, v in kwargs.items()}
-        return func(*args, **kwargs)
-    return wrapped
-
-def add_word_data(statement_df: pd.DataFrame) -> pd.DataFrame:
-    for word in WORD_LIST:
-        try:
-            statement_df[f'{word}_present'] = statement_df['description'].str.contains(word)
-        except:
-            print(f'Could not do {word}')
-    return statement_df
-
-@hash_dict
-@lru_cache(maxsize=50)
+    if ONLINE_MODEL is None and (SVC_MODEL is None or FEATURIZER is None):
+        raise ValueError('No statement model yet, train one from ML Management')
+    if len(statements_df) == 0:
+        if top_k is None:
+            return pd.Series([], index=statements_df.index, name='category_id', dtype='int64')
+        return pd.DataFrame({'rank': [], 'category_id': [], 'score': []}, index=statements_df.index, dtype='int64')
+    model = ONLINE_MODEL
+    if model is None:
+        model = SVC_MODEL
+        features = SCALER.transform(FEATURIZER.transform(statements_df))
+    else:
+        features = hashed_features(statements_df)
+    if top_k is None:
+        return pd.Series(model.predict(features), index=statements_df.index, name='category_id')
+    categories, scores = rank_categories(model, features, top_k)
+    return pd.DataFrame({
+        'rank': np.tile(np.arange(1, categories.shape[1] + 1), len(statements_df)),
+        'category_id': categories.ravel(),
+        'score': scores.ravel(),
+    }, index=statements_df.index.repeat(categories.shape[1]))
+
 def predict_category(statement_entry: dict) -> int:
-    statement_df = pd.DataFrame([statement_entry])
-    statement_df = add_word_data(statement_df)
-    statement_df = statement_df.set_index('taction_id')
-    #statement_df = statement_df.drop(['id', 'date', 'statement_month', 'statement_year', 'description', 'taction_id'], axis='columns')
-    statement_df = statement_df.drop(['id', 'date', 'statement_month', 'statement_year', 'description'], axis='columns')
-    print([item for item in list(statement_df.columns) if '_present' not in item])
-    scaled_data = SCALER.transform(statement_df)
-    return SVC_MODEL.predict(scaled_data)[0]
-
-def train_model(db: DbAccess):
+    return predict_categories(pd.DataFrame([statement_entry])).iloc[0]
+
+def training_data(db: DbAccess) -> tuple:
+    """ Assigned statement entries and the category of their taction, read in full """
+    labeled = db.get_labeled_statements()
+    return labeled, labeled['category_id']
+
+def train_model(db: DbAccess, estimator=None):
+    """ Fit and save the statement model
+
+    estimator is the unfitted classifier to train, by default one with the
+    same settings as the current model, so a model picked by
+    model_selection keeps its settings across retrains.
+    """
     global SVC_MODEL
     global SCALER
-    global WORD_LIST
-    
-    word_counts = {}
-    statement_transactions = db.get_statement_transactions()
-    for text in statement_transactions['description'].values:
-        for word in text.split(' '):
-            if word not in word_counts:
-                word_counts[word] = 0
-            word_counts[word] += 1
-    # Words that do not occur more than once are not very unique
-    keys_to_remove = []
-    for key in word_counts:
-        if word_counts[key] == 1:
-            keys_to_remove.append(key)
-    for key in keys_to_remove:
-        word_counts.pop(key)
-
-    statement_data = statement_transactions.copy()
-    statement_data = statement_data.loc[~statement_data['taction_id'].isna(), :]
-    taction_assignments = statement_data['taction_id']
-    word_list = []
-    for word in word_counts:
-        word_list.append(word)
-        try:
-            statement_data[f'{word}_present'] = statement_data['description'].str.contains(word)
-        except:
-            print(f'Could not do {word}')
-
-    statement_data = statement_data.drop(['id', 'date', 'statement_month', 'statement_year', 'description'], axis='columns')
-
-    subs = db.get_subtotals().copy()
-    matching_subs = subs.loc[subs['taction_id'].isin(taction_assignments), :]
-    # We can only learn from transactions with single category
-    count_map = matching_subs['taction_id'].value_counts().to_dict()
-    matching_subs['occurrences'] = matching_subs['taction_id'].map(count_map)
-    filtered_subs = matching_subs.loc[matching_subs['occurrences'] == 1, :]
-    statement_data = statement_data.loc[statement_data['taction_id'].isin(filtered_subs['taction_id']), :]
-
-    statement_data = statement_data.set_index('taction_id').sort_index()
-    filtered_subs = filtered_subs.set_index('taction_id').sort_index()
-
-    scaler = StandardScaler().fit(statement_data)
-    scaled_statement_data = scaler.transform(statement_data)
-    svc_model = SVC()
-    svc_model.fit(scaled_statement_data, np.ravel(filtered_subs['category_id']))
+    global FEATURIZER
+
+    # Only entries labeled or changed since the last train are read
+    training_set = load_training_set(db, TRAINING_SET_FILE)
+    featurizer = training_set.featurizer()
+    features = training_set.features(featurizer)
+    categories = training_set.labels
+    # Centering would densify the matrix, and does not move the RBF kernel
+    scaler = StandardScaler(with_mean=False).fit(features)
+    if estimator is not None:
+        svc_model = estimator
+    elif SVC_MODEL is not None:
+        svc_model = clone(SVC_MODEL)
+    else:
+        svc_model = SVC()
+    svc_model.fit(scaler.transform(features), np.ravel(categories))
     dump(svc_model, 'statement_to_category_model.joblib') 
     SVC_MODEL = svc_model
 
     words = pd.DataFrame()
-    words['words'] = word_list
+    words['words'] = featurizer.words
     words.to_csv('statement_word_list.csv')
-    WORD_LIST = word_list
-    dump(word_list, 'word_list.joblib')
+    dump(featurizer, 'statement_featurizer.joblib')
+    FEATURIZER = featurizer
 
     dump(scaler, 'statement_scaler.joblib')
-    SCALER = scaler
\ No newline at end of file
+    SCALER = scaler
+
+    if ONLINE_MODEL is not None:
+        train_online_model(db)
+    else:
+        update_model_hash(db)
+
+def save_online_model(model: SGDClassifier):
+    """ Checkpoint written whole, so a crash mid-write keeps the last one """
+    dump(model, f'{ONLINE_MODEL_FILE}.tmp')
+    os.replace(f'{ONLINE_MODEL_FILE}.tmp', ONLINE_MODEL_FILE)
+
+def fit_online_model(features, categories: np.ndarray, classes: np.ndarray) -> SGDClassifier:
+    """ ONLINE_EPOCHS shuffled partial_fit passes, as the online model is built """
+    model = SGDClassifier(loss='modified_huber', random_state=0)
+    order = np.random.default_rng(0)
+    for _ in range(ONLINE_EPOCHS):
+        shuffled = order.permutation(len(categories))
+        model.partial_fit(features[shuffled], categories[shuffled], classes=classes)
+    return model
+
+def train_online_model(db: DbAccess):
+    """ Build the online model from every labeled entry """
+    global ONLINE_MODEL
+
+    labeled = db.get_labeled_statements()
+    features = hashed_features(labeled)
+    categories = labeled['category_id'].to_numpy()
+    # Every category is a class from the start, partial_fit cannot add one
+    classes = np.union1d(db.get_categories()['id'].to_numpy(), categories)
+    with ONLINE_LOCK:
+        model = fit_online_model(features, categories, classes)
+        with PENDING_LOCK:
+            PENDING_ASSIGNMENTS.clear()
+        save_online_model(model)
+        ONLINE_MODEL = model
+    update_model_hash(db)
+
+def record_assignment(entry_id: int, taction_id: int):
+    """ DbAccess assignment hook, learned on the next learn_assignments """
+    with PENDING_LOCK:
+        PENDING_ASSIGNMENTS.append(entry_id)
+
+def watch_assignments(db: DbAccess):
+    if record_assignment not in db.assignment_hooks:
+        db.add_assignment_hook(record_assignment)
+
+def learn_assignments(db: DbAccess) -> int:
+    """ Update the online model with the assignments made since it last learned
+
+    Call once the assignments have committed, an assignment that was rolled
+    back is not found and not learned.  Entries in categories added since
+    the model was built wait for the next full train.  Returns how many
+    entries were learned.
+    """
+    global ONLINE_MODEL
+
+    with PENDING_LOCK:
+        statement_ids = list(PENDING_ASSIGNMENTS)
+        PENDING_ASSIGNMENTS.clear()
+    with ONLINE_LOCK:
+        if ONLINE_MODEL is None or len(statement_ids) == 0:
+            return 0
+        labeled = db.get_labeled_statements(statement_ids)
+        labeled = labeled.loc[labeled['category_id'].isin(ONLINE_MODEL.classes_), :]
+        if len(labeled) == 0:
+            return 0
+        model = copy.deepcopy(ONLINE_MODEL)
+        model.partial_fit(hashed_features(labeled), labeled['category_id'].to_numpy())
+        save_online_model(model)
+        ONLINE_MODEL = model
+    update_model_hash(db)
+    return len(labeled)
+
+def update_model_hash(db: DbAccess):
+    """ Rehash the saved model and store its predictions for the unassigned entries """
+    global MODEL_HASH
+    MODEL_HASH = model_hash()
+    cache_predictions(db)
+
+def store_predictions(db: DbAccess, statements_df: pd.DataFrame) -> pd.DataFrame:
+    """ Predict statements_df in one batch and store it under MODEL_HASH """
+    predictions = predict_categories(statements_df, top_k=1)
+    db.put_statement_predictions(MODEL_HASH, statements_df['id'], predictions['category_id'], predictions['score'])
+    return predictions
+
+def cache_predictions(db: DbAccess) -> int:
+    """ Store predictions for the unassigned entries the current model has none for
+
+    Run after an import or retrain.  Returns how many entries were predicted.
+    """
+    if MODEL_HASH is None:
+        return 0
+    data = db.get_statement_transactions(include_assigned=False, model_hash=MODEL_HASH)
+    missing = data.loc[data['predicted_category_id'].isna(), :]
+    if len(missing) > 0:
+        store_predictions(db, missing)
+    return len(missing)
+
+def get_predicted_statements(db: DbAccess, **filters) -> pd.DataFrame:
+    """ db.get_statement_transactions(**filters) with predicted_category_id and prediction_confidence
+
+    Stored predictions are read in the same query, entries without one are
+    predicted together and stored.  Both are NA without a model.
+    """
+    if MODEL_HASH is None:
+        data = db.get_statement_transactions(**filters)
+        data['predicted_category_id'] = pd.NA
+        data['prediction_confidence'] = np.nan
+        return data
+    data = db.get_statement_transactions(model_hash=MODEL_HASH, **filters)
+    missing = data['predicted_category_id'].isna()
+    if missing.any():
+        predictions = store_predictions(db, data.loc[missing, :])
+        data.loc[missing, 'predicted_category_id'] = predictions['category_id'].to_numpy()
+        data.loc[missing, 'prediction_confidence'] = predictions['score'].to_numpy()
+    data['predicted_category_id'] = data['predicted_category_id'].astype('Int64')
+    return data
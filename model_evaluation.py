@@ -0,0 +1,165 @@
+""" Statement categorizer evaluation
+
+python model_evaluation.py [db_file] [output] [candidates]
+
+The labeled statement entries are split by date: the model candidates are
+trained on the older entries and scored on the newest HOLDOUT_FRACTION, as
+they would be used on statements that arrive after a retrain.  Each
+candidate reports accuracy, top-k accuracy, training time, peak traced
+memory and prediction latency, and the results are written as JSON to
+compare across versions.
+"""
+
+from pathlib import Path
+import datetime
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC, LinearSVC
+
+from newdb_access import DbAccess
+import ml_statement
+from ml_statement import fit_online_model, rank_categories, training_data
+from statement_features import StatementFeaturizer, hashed_features
+
+# Newest share of the labeled entries held out for scoring
+HOLDOUT_FRACTION = 0.2
+TOP_K = 3
+# Holdout entries predicted one at a time for the latency figures
+LATENCY_ENTRIES = 200
+
+def vocabulary_pipeline(make_estimator):
+    """ Fit StatementFeaturizer, the scaler and an estimator as train_model does """
+
+    def fit(train_df: pd.DataFrame, categories: np.ndarray) -> tuple:
+        featurizer = StatementFeaturizer().fit(train_df['description'])
+        scaler = StandardScaler(with_mean=False)
+        model = make_estimator().fit(scaler.fit_transform(featurizer.transform(train_df)), categories)
+        return model, lambda frame: scaler.transform(featurizer.transform(frame))
+
+    return fit
+
+def current_estimator():
+    """ Unfitted copy of the saved statement model, so its selected settings count """
+    if ml_statement.SVC_MODEL is None:
+        return SVC()
+    return clone(ml_statement.SVC_MODEL)
+
+def online_pipeline(train_df: pd.DataFrame, categories: np.ndarray) -> tuple:
+    """ Fit the online model on hashed features as train_online_model does """
+    model = fit_online_model(hashed_features(train_df), categories, np.unique(categories))
+    return model, hashed_features
+
+# Candidate name: fit(train_df, categories) -> (model, featurize).  svc has
+# the saved model's settings, a default SVC before the first train.
+CANDIDATES = {
+    'svc': vocabulary_pipeline(current_estimator),
+    'linear_svc': vocabulary_pipeline(LinearSVC),
+    'logistic_regression': vocabulary_pipeline(lambda: LogisticRegression(max_iter=1000)),
+    'online_sgd': online_pipeline,
+}
+
+def time_split(labeled: pd.DataFrame, holdout_fraction: float = HOLDOUT_FRACTION) -> tuple:
+    """ (train, test) with test the newest holdout_fraction of the entries by date """
+    labeled = labeled.sort_values(['date', 'id'], kind='stable').reset_index(drop=True)
+    split = int(len(labeled) * (1.0 - holdout_fraction))
+    return labeled.iloc[:split], labeled.iloc[split:]
+
+def prediction_latencies(model, featurize, test_df: pd.DataFrame) -> list:
+    """ Milliseconds to featurize and predict each of the first LATENCY_ENTRIES alone """
+    latencies = []
+    for entry in test_df.head(LATENCY_ENTRIES).to_dict(orient='records'):
+        start = time.perf_counter()
+        model.predict(featurize(pd.DataFrame([entry])))
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return latencies
+
+def score_model(model, featurize, test_df: pd.DataFrame, top_k: int = TOP_K) -> dict:
+    """ Accuracy, top_k accuracy and prediction latency on test_df """
+    categories = test_df['category_id'].to_numpy()
+    start = time.perf_counter()
+    features = featurize(test_df)
+    predicted = model.predict(features)
+    batch_s = time.perf_counter() - start
+    ranked, _ = rank_categories(model, features, top_k)
+    latencies = prediction_latencies(model, featurize, test_df)
+    return {
+        'accuracy': float(np.mean(predicted == categories)),
+        f'top_{top_k}_accuracy': float(np.mean((ranked == categories[:, None]).any(axis=1))),
+        'predict_ms': float(np.mean(latencies)),
+        'predict_p95_ms': float(np.percentile(latencies, 95)),
+        'batch_ms_per_entry': batch_s * 1000.0 / len(test_df),
+    }
+
+def evaluate_candidate(fit, train_df: pd.DataFrame, test_df: pd.DataFrame, top_k: int = TOP_K) -> dict:
+    train_categories = train_df['category_id'].to_numpy()
+    start = time.perf_counter()
+    model, featurize = fit(train_df, train_categories)
+    train_s = time.perf_counter() - start
+    # Traced on a second fit, tracemalloc slows everything it watches.  It
+    # sees Python and numpy allocations, not libsvm's own kernel cache.
+    tracemalloc.start()
+    fit(train_df, train_categories)
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    results = {'train_s': train_s, 'peak_mb': peak_mb}
+    results.update(score_model(model, featurize, test_df, top_k))
+    return results
+
+def evaluate(db: DbAccess, candidates: list = None, holdout_fraction: float = HOLDOUT_FRACTION) -> dict:
+    labeled, _ = training_data(db)
+    train_df, test_df = time_split(labeled, holdout_fraction)
+    if len(train_df) == 0 or len(test_df) == 0:
+        raise ValueError(f'{len(labeled)} labeled entries are too few to hold any out')
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'platform': platform.platform(),
+        },
+        'train_entries': len(train_df),
+        'test_entries': len(test_df),
+        'split_date': str(test_df['date'].iloc[0]),
+        'vocabulary_size': len(StatementFeaturizer().fit(train_df['description']).vocabulary),
+        'candidates': {},
+    }
+    for name in candidates or list(CANDIDATES):
+        results['candidates'][name] = evaluate_candidate(CANDIDATES[name], train_df, test_df)
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        db_file = Path(sys.argv[1])
+    else:
+        db_file = Path('example.db')
+    if len(sys.argv) > 2:
+        output = Path(sys.argv[2])
+    else:
+        output = Path('model_evaluation.json')
+    if len(sys.argv) > 3:
+        candidates = sys.argv[3].split(',')
+    else:
+        candidates = None
+    db = DbAccess(db_file)
+    print(f"Evaluating {', '.join(candidates or list(CANDIDATES))}...")
+    results = evaluate(db, candidates)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+    print(f"{results['train_entries']} training and {results['test_entries']} holdout entries from {results['split_date']}")
+    measures = list(next(iter(results['candidates'].values())))
+    print(f"{'candidate':<22}" + ''.join(f'{measure:>20}' for measure in measures))
+    for name, measured in results['candidates'].items():
+        print(f'{name:<22}' + ''.join(f'{value:>20.3f}' for value in measured.values()))
+    print(f'Results written to {output}')
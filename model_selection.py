@@ -0,0 +1,134 @@
+""" Statement categorizer model selection
+
+python model_selection.py [db_file]
+
+Every candidate estimator setting is cross-validated on time-ordered folds
+of the older labeled entries, each fold fitted in its own process.  The
+best setting by mean fold accuracy then meets the current model's setting
+on the newest entries, both fitted on the same older ones.  It is trained
+and saved by train_model only if it is strictly more accurate on those
+entries and its median single-entry prediction time is at most
+LATENCY_TOLERANCE above the current one's.  The times are taken over
+LATENCY_REPEATS rounds, the two models alternating, so timer noise does not
+decide between near equal models.  Otherwise the saved model files stay as
+they are.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.svm import SVC, LinearSVC
+
+from newdb_access import DbAccess
+import ml_statement
+from model_evaluation import prediction_latencies, score_model, time_split, vocabulary_pipeline
+
+# (estimator class, settings) searched, regularization strength C foremost
+SEARCH_SPACE = [
+    (SVC, {'C': 0.3}),
+    (SVC, {'C': 1.0}),
+    (SVC, {'C': 3.0}),
+    (SVC, {'C': 10.0}),
+    (LinearSVC, {'C': 0.1, 'max_iter': 5000}),
+    (LinearSVC, {'C': 1.0, 'max_iter': 5000}),
+    (LogisticRegression, {'C': 0.3, 'max_iter': 1000}),
+    (LogisticRegression, {'C': 1.0, 'max_iter': 1000}),
+    (LogisticRegression, {'C': 3.0, 'max_iter': 1000}),
+]
+SEARCH_FOLDS = 3
+# Rounds of single-entry prediction timings per model, and how much slower
+# by median the candidate may be
+LATENCY_REPEATS = 5
+LATENCY_TOLERANCE = 0.1
+
+def fold_accuracy(estimator_class, settings: dict, train_df: pd.DataFrame, test_df: pd.DataFrame) -> float:
+    """ Accuracy of one setting on one fold, run in a pool process """
+    fit = vocabulary_pipeline(lambda: estimator_class(**settings))
+    model, featurize = fit(train_df, train_df['category_id'].to_numpy())
+    return float(np.mean(model.predict(featurize(test_df)) == test_df['category_id'].to_numpy()))
+
+def search(labeled: pd.DataFrame, workers: int = None) -> list:
+    """ (mean fold accuracy, estimator class, settings) of SEARCH_SPACE, best first """
+    folds = list(TimeSeriesSplit(n_splits=SEARCH_FOLDS).split(labeled))
+    # Spawned, forking the app's threads and connections is not safe
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [
+            [
+                pool.submit(fold_accuracy, estimator_class, settings, labeled.iloc[train_rows], labeled.iloc[test_rows])
+                for train_rows, test_rows in folds
+            ]
+            for estimator_class, settings in SEARCH_SPACE
+        ]
+        results = [
+            (float(np.mean([future.result() for future in fold_futures])), estimator_class, settings)
+            for fold_futures, (estimator_class, settings) in zip(futures, SEARCH_SPACE)
+        ]
+    return sorted(results, key=lambda result: -result[0])
+
+def fit_holdout(estimator, train_df: pd.DataFrame) -> tuple:
+    """ (model, featurize) of a copy of estimator fitted on train_df """
+    return vocabulary_pipeline(lambda: clone(estimator))(train_df, train_df['category_id'].to_numpy())
+
+def median_latencies(fitted: dict, test_df: pd.DataFrame) -> dict:
+    """ Median prediction ms of each (model, featurize), timed in alternating rounds """
+    latencies = {name: [] for name in fitted}
+    for _ in range(LATENCY_REPEATS):
+        for name, (model, featurize) in fitted.items():
+            latencies[name] += prediction_latencies(model, featurize, test_df)
+    return {name: float(np.median(values)) for name, values in latencies.items()}
+
+def select_model(db: DbAccess, workers: int = None) -> dict:
+    """ Search for a better statement model and keep it only if it beats the current one """
+    labeled, _ = ml_statement.training_data(db)
+    train_df, test_df = time_split(labeled)
+    results = search(train_df, workers)
+    _, estimator_class, settings = results[0]
+    candidate = estimator_class(**settings)
+    report = {
+        'search': [
+            {'estimator': result_class.__name__, 'settings': result_settings, 'accuracy': accuracy}
+            for accuracy, result_class, result_settings in results
+        ],
+        'candidate': {'estimator': estimator_class.__name__, 'settings': settings},
+    }
+    fitted = {'candidate': fit_holdout(candidate, train_df)}
+    if ml_statement.SVC_MODEL is not None:
+        current = ml_statement.SVC_MODEL
+        report['current'] = {'estimator': type(current).__name__, 'settings': current.get_params()}
+        fitted['current'] = fit_holdout(current, train_df)
+    for name, (model, featurize) in fitted.items():
+        report[name].update(score_model(model, featurize, test_df))
+    for name, median_ms in median_latencies(fitted, test_df).items():
+        report[name]['median_predict_ms'] = median_ms
+    if 'current' not in report:
+        report['kept'] = True
+    else:
+        report['kept'] = (
+            report['candidate']['accuracy'] > report['current']['accuracy']
+            and report['candidate']['median_predict_ms'] <= report['current']['median_predict_ms'] * (1.0 + LATENCY_TOLERANCE)
+        )
+    if report['kept']:
+        ml_statement.train_model(db, estimator=candidate)
+    return report
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        db_file = Path(sys.argv[1])
+    else:
+        db_file = Path('example.db')
+    db = DbAccess(db_file)
+    report = select_model(db)
+    for result in report['search']:
+        print(f"{result['estimator']:<20}{str(result['settings']):<32}{result['accuracy']:>10.3f}")
+    for name in ['current', 'candidate']:
+        if name in report:
+            print(f"{name}: {report[name]['estimator']} accuracy {report[name]['accuracy']:.3f}, {report[name]['median_predict_ms']:.2f} ms median per prediction")
+    print('Kept the candidate' if report['kept'] else 'Kept the current model')
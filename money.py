@@ -0,0 +1,44 @@
+""" Money representations
+
+Amounts are Decimal by default.  The integer cents mode keeps them as int64
+cents so pandas can sum, group and compare them natively; they only become
+Decimal again when written back or shown.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+CENT = Decimal('0.01')
+
+def to_cents(amount: Decimal) -> int:
+    return int((Decimal(str(amount)) / CENT).to_integral_value())
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(int(cents)) * CENT
+
+def is_cents(value) -> bool:
+    return isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_))
+
+def cents_from_amounts(amounts: pd.Series) -> pd.Series:
+    # Amounts are stored with two decimals, so rounding the scaled float
+    # recovers the cents exactly.  astype converts Decimal objects far
+    # faster than to_numeric does.
+    cents = (amounts.astype('float64') * 100).round()
+    if cents.isna().any():
+        return cents.astype('Int64')
+    return cents.astype('int64')
+
+def amounts_to_float(amounts: pd.Series) -> pd.Series:
+    """ Float dollars for display from either representation """
+    if pd.api.types.is_integer_dtype(amounts):
+        return amounts / 100.0
+    return amounts.astype(float)
+
+def amounts_to_decimal(amounts: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(amounts):
+        # Each distinct amount is converted once
+        decimals = {cents: from_cents(cents) for cents in amounts.dropna().unique()}
+        return amounts.astype(object).map(decimals).where(amounts.notna(), None)
+    return amounts
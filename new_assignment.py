@@ -9,11 +9,14 @@ from newdb_access import DbAccess
 import view_translation as vt
 from batch_assignment import batch_assignment
 from auto_assign import auto_assign
+from ml_statement import get_predicted_statements, learn_assignments
 
 FOURTEEN_DAYS = pd.Timedelta(days=14)
 
 def show_assignment_page(st: stl, db: DbAccess):
     st.markdown('## Statement Assignment')
+    # Assignments made since the last run, before suggesting from the model
+    learn_assignments(db)
     left, right = st.columns(2)
     include_deferred = right.checkbox('Include Deferred Entries')
     account_list = ['None'] + list(db.get_accounts()['name'])
@@ -23,7 +26,9 @@ def show_assignment_page(st: stl, db: DbAccess):
     else:
         account_id = None
 
-    statement_transactions = db.get_statement_transactions(
+    # Suggested categories come stored with the entries, see ml_statement
+    statement_transactions = get_predicted_statements(
+        db,
         include_assigned=False, 
         include_deferred=include_deferred,
         account_id=account_id,
@@ -7,10 +7,8 @@ from newdb_access import DbAccess
 import view_translation as vt
 
 def _delete_entry(db, candidate):
-    sql = f'DELETE FROM statement_transactions WHERE id={candidate}'
-    stl.markdown(sql)
-    db.cursor.execute(sql)
-    db.con.commit()
+    stl.markdown(f'Deleting statement {candidate}')
+    db.delete_statement_transaction(candidate)
 
 def integrity_check(st: stl, db: DbAccess):
     statement_integrity(st, db)
@@ -90,8 +88,7 @@ def statement_integrity(st: stl, db: DbAccess):
         if st.checkbox('Remove Statement Assignment'):
             statement_id = st.selectbox('Statement ID', options=duplicate_statements['id'])
             if st.button('Remove Assignemnt'):
-                db.cursor.execute(f'UPDATE statement_transactions SET taction_id=NULL WHERE id={statement_id}')
-                db.con.commit()
+                db.assign_statement_entry(statement_id, None)
                 st.markdown(f'Assignment on {statement_id} removed!')
 
     if st.checkbox('Delete Statement Entry?'):
@@ -6,9 +6,8 @@ import streamlit as stl
 
 from newdb_access import DbAccess
 import view_translation as vt
-
-def convert_df(df):
-   return df.to_csv().encode('utf-8')
+from money import amounts_to_float
+from export import view_export
 
 def view_search(st: stl, db: DbAccess):
     st.markdown('## Search')
@@ -47,7 +46,11 @@ def view_search(st: stl, db: DbAccess):
 
     if st.checkbox('Transactions'):
         only_valid = st.checkbox('Only Valid?', value=True)
-        transactions = db.get_transactions(
+        if len(categories) > 0:
+            first_category_id = db.category_translate(categories[0], 'id')
+        else:
+            first_category_id = None
+        filters = dict(
             amount=amount,
             account_id=account_id,
             after_date=start_date,
@@ -55,16 +58,11 @@ def view_search(st: stl, db: DbAccess):
             include_statement_links=True,
             only_valid=only_valid,
             description_text=description,
-        )        
-
-        if len(categories) > 0:
-            first_category_id = db.category_translate(categories[0], 'id')
-            subs = db.get_subtotals(category_id=first_category_id)
-            transactions = transactions.loc[transactions['taction_id'].isin(subs['taction_id']), :]
+            category_id=first_category_id,
+            only_unmapped=st.checkbox('Only unmapped statements'),
+        )
+        transactions = db.get_transactions(**filters)
 
-        if st.checkbox('Only unmapped statements'):
-            transactions = transactions.loc[transactions['statement_id'].isna(), :]
-        
         columns = transactions.columns
         displayed_columns = st.multiselect('Displayed Columns', options=columns, default=list(columns))
         st.markdown(str(len(transactions)))
@@ -72,14 +70,7 @@ def view_search(st: stl, db: DbAccess):
             st.markdown(f"Total amount: ${transactions['amount'].sum()}")
         view_frame = vt.translate_transactions(transactions[displayed_columns], db=db)
         st.write(view_frame)
-        csv = convert_df(transactions)
-        st.download_button(
-            "Press to Download",
-            csv,
-            "searach.csv",
-            "text/csv",
-            key='download-csv'
-        )
+        view_export(st, 'search-export', 'search', lambda: db.iter_transactions(**filters))
 
         #view_data = vt.translate_transactions(transactions)
     if st.checkbox('Statements'):
@@ -87,8 +78,19 @@ def view_search(st: stl, db: DbAccess):
             amount=amount, 
             account_id=account_id,
             request_taction_id=taction_id,
+            description_text=description,
         )
         st.write(vt.translate_statement_transactions(statements))
+
+    if description is not None and st.checkbox('Best Description Matches'):
+        st.markdown("### Transactions")
+        tactions = db.search_tactions(description)
+        tactions['account_id'] = db.translate_series(tactions['account_id'], 'account', 'name')
+        st.write(tactions)
+        st.markdown("### Statements")
+        statements = db.search_statement_transactions(description, account_id=account_id)
+        statements['amount'] = amounts_to_float(statements['amount'])
+        st.write(statements)
         
     if st.checkbox('Budget Adjustments'):
         st.markdown("### Budget Adjustments")
@@ -8,6 +8,7 @@ import pandas as pd
 
 from newdb_access import DbAccess
 from statement_manipulations import fix_dates
+from ml_statement import cache_predictions
 
 def view_statement_entry(st: stl, db: DbAccess):
     st.markdown('## Statement Entry')
@@ -116,30 +117,33 @@ def view_statement_entry(st: stl, db: DbAccess):
         if st.button('Add to database'):
             added = 0
             already_exists = 0
-            for item in formed_data.to_dict(orient='records'):
-                amount = item['amount']
-                date = item['date']
-                description = item['description']
-                if amount == 0.0:
-                    continue
-                duplicates = current_statements.loc[
-                    (current_statements['date'] == date) &
-                    (current_statements['account_id'] == account_id) &
-                    (current_statements['amount'] == amount) &
-                    (current_statements['description'] == description)
-                ]
-                if len(duplicates) == 0:
-                    db.add_statement_transaction(
-                        date,
-                        month,
-                        year,
-                        account_id,
-                        amount,
-                        description=description,
-                    )
-                    added += 1
-                else:
-                    st.write(f'{date} - {description} already exists! Aborting...')
-                    already_exists += 1
+            with db.transaction():
+                for item in formed_data.to_dict(orient='records'):
+                    amount = item['amount']
+                    date = item['date']
+                    description = item['description']
+                    if amount == 0.0:
+                        continue
+                    duplicates = current_statements.loc[
+                        (current_statements['date'] == date) &
+                        (current_statements['account_id'] == account_id) &
+                        (current_statements['amount'] == amount) &
+                        (current_statements['description'] == description)
+                    ]
+                    if len(duplicates) == 0:
+                        db.add_statement_transaction(
+                            date,
+                            month,
+                            year,
+                            account_id,
+                            amount,
+                            description=description,
+                        )
+                        added += 1
+                    else:
+                        st.write(f'{date} - {description} already exists! Aborting...')
+                        already_exists += 1
+            # Suggestions for the new entries, stored before the assignment page asks
+            cache_predictions(db)
             st.write(f'Added {added}')
             st.write(f'{already_exists} Already Existed')
\ No newline at end of file
@@ -2,13 +2,14 @@
 
 import streamlit as st
 
-from newdb_access import DbAccess
+from db_session import get_db, get_query_log
 from new_assignment import show_assignment_page
 from new_statement_entry import view_statement_entry
 from new_input import show_input
 from new_integrity_check import integrity_check
 from new_search import view_search
 from ml_management import ml_management
+from ml_statement import watch_assignments
 from delete_tab import display_delete
 from budget_managerment import display_budget_configuration
 from balances import view_balances
@@ -17,11 +18,18 @@ from period_verification import view_period_verification
 from visualize import view_visualize_tab
 from hsa_mapper import view_hsa_mapper
 from hsa import show_hsa_page
-
-db = DbAccess('example.db')
+from query_panel import view_query_stats
 
 st.set_page_config(layout="wide")
 
+# Pages that only read, they can run on an in-memory copy of the file
+REPORT_TASKS = ['Balances', 'Visualize', 'Period Verification', 'Visualization']
+
+db = get_db(st, 'example.db')
+query_log = get_query_log(st, db)
+query_log.clear()
+watch_assignments(db)
+
 """# Expense Tracker"""
 
 task = st.sidebar.radio('Tasks', options=[
@@ -40,6 +48,10 @@ task = st.sidebar.radio('Tasks', options=[
     'HSA Mapping',
     'HSA',
 ])
+show_query_stats = st.sidebar.checkbox('Query Stats')
+if task in REPORT_TASKS and st.sidebar.checkbox('Read From Memory Replica'):
+    db = get_db(st, 'example.db', read_replica=True)
+    get_query_log(st, db)
 
 if task == 'Statement Assignment':
     show_assignment_page(st, db)
@@ -68,4 +80,7 @@ elif task == 'Visualization':
 elif task == 'HSA':
     show_hsa_page(db)
 else:
-    st.markdown(f'Unknown task {task}')
\ No newline at end of file
+    st.markdown(f'Unknown task {task}')
+
+if show_query_stats:
+    view_query_stats(st.sidebar, db, query_log)
@@ -2,28 +2,344 @@
 
 from pathlib import Path
 from decimal import Decimal
+import contextlib
 import datetime
+import time
 
 import sqlite3
 import pandas as pd
 import numpy as np
 
 from budget_helper import get_monthly_budget_increment
+from migrations import migrate
+from query_builder import Where, chunk_values, date_param, fts_phrase, generate_where_statement
+from money import to_cents, from_cents, is_cents, cents_from_amounts
+from result_cache import ResultCache, cached_read
+from snapshot_cache import SnapshotCache
+from write_queue import WriteQueue, queued_write
 
 ZERO = Decimal('0.00')
-
-def generate_where_statement(where_list: list) -> str:
-    if len(where_list) > 0:
-        return f" WHERE {' AND '.join(where_list)}"
-    else:
-        return ""
+MONEY_FIELDS = ['amount', 'balance', 'increment'] + [f'month_{i}' for i in range(1, 13)]
+DIMENSION_TABLES = ['account', 'method', 'category', 'budget']
+# Shortest text the trigram description indexes can match
+MIN_FTS_LENGTH = 3
+# Constant filters a whole-table snapshot can apply itself
+SNAPSHOT_FILTERS = {'valid = 1': ('valid', 1), 'not_real = 0': ('not_real', 0)}
+# Rows per frame when streaming a query, see _read_sql_chunks
+EXPORT_CHUNK_SIZE = 10000
+SUB_FIELDS = [
+    'id',
+    'amount',
+    'category_id',
+    'taction_id',
+    'valid',
+    'not_real',
+    'date',
+]
 
 class DbAccess(object):
 
-    def __init__(self, db_file: Path):
-        self.con = sqlite3.connect(db_file)
+    def __init__(self, db_file: Path, run_migrations: bool = True, integer_cents: bool = False, cache_size: int = 128, timeout: float = 5.0, check_same_thread: bool = True, snapshot_dir: Path = None, read_replica: bool = False, write_queue: WriteQueue = None):
+        # Queued writes run on the queue's thread and still use self.con to
+        # check the cache, so it cannot be tied to the creating thread
+        if write_queue is not None:
+            check_same_thread = False
+        self.con = sqlite3.connect(db_file, cached_statements=256, timeout=timeout, check_same_thread=check_same_thread)
         self.cursor = self.con.cursor()
+        # Amounts are returned as int64 cents instead of Decimal, and integer
+        # amount arguments are read as cents
+        self.integer_cents = integer_cents
+        # id <-> name maps per dimension table, rebuilt after writes to it
+        self.dimension_maps = {}
+        # Read results are reused until a write from any connection touches
+        # one of the tables they came from
+        self.result_cache = ResultCache(cache_size)
+        self.cache_state = None
+        self.table_versions = {}
+        # Writes inside transaction() share one commit
+        self.transaction_depth = 0
+        self.transaction_failed = False
+        # Callables given a record of each statement run, see query_log
+        self.query_hooks = []
+        # Callables given (entry_id, taction_id) of each statement assignment
+        self.assignment_hooks = []
+        # Unfiltered whole-table reads come from on-disk snapshots when set,
+        # a replica already holds every table in memory
+        if snapshot_dir is None or read_replica:
+            self.snapshots = None
+        else:
+            self.snapshots = SnapshotCache(snapshot_dir)
+        if run_migrations:
+            migrate(self.con)
+        # Reads run on an in-memory copy of the file when set.  Writes still
+        # go to the file and are replayed on the copy, which is copied again
+        # only after another connection commits.
+        self.replica = None
+        self.replica_version = None
+        if read_replica:
+            self.replica = sqlite3.connect(':memory:', cached_statements=256, check_same_thread=check_same_thread)
+            self.refresh_replica()
+        # Write methods run on the queue's writer connection when set, see
+        # write_queue.  writer_con is that connection while one runs.
+        self.write_queue = write_queue
+        self.writer_con = None
+        self.writer_cursor = None
+
+    @contextlib.contextmanager
+    def on_writer(self, con: sqlite3.Connection):
+        """ Run reads and writes on con, the write queue's connection """
+        self.writer_con = con
+        self.writer_cursor = con.cursor()
+        try:
+            yield self
+        finally:
+            self.writer_con = None
+            self.writer_cursor = None
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Commit every write in the block together, or none of them
+
+        Nested blocks join the outermost one.  With a write queue the block
+        holds the writer and is a single queued write.
+        """
+        if self.write_queue is not None and self.writer_con is None:
+            with self.write_queue.hold(on_rollback=self._forget_cache) as con:
+                with self.on_writer(con):
+                    with self.transaction():
+                        yield self
+            return
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth -= 1
+            self.transaction_failed = True
+            if self.transaction_depth == 0:
+                self.transaction_failed = False
+                self._rollback()
+            raise
+        self.transaction_depth -= 1
+        if self.transaction_depth == 0:
+            if self.transaction_failed:
+                # A nested block failed and its caller carried on
+                self.transaction_failed = False
+                self._rollback()
+                raise sqlite3.OperationalError('Transaction rolled back after a nested write failed')
+            self._commit_connections()
+
+    def _commit(self):
+        if self.transaction_depth == 0:
+            self._commit_connections()
+
+    def _commit_connections(self):
+        if self.writer_con is not None:
+            # The write queue commits the whole batch
+            return
+        self.con.commit()
+        if self.replica is not None:
+            self.replica.commit()
+
+    def _rollback(self):
+        # On the writer the queue rolls the write back to its savepoint
+        if self.writer_con is None:
+            self.con.rollback()
+            if self.replica is not None:
+                self.replica.rollback()
+        self._forget_cache()
+
+    def _forget_cache(self):
+        """ Drop every cached result after a rollback
+
+        Reads inside the rolled back writes may have cached rows that no
+        longer exist, or table versions a later write will reach again, and
+        total_changes does not go back down to show it.  The write queue
+        calls this when it rolls back a queued write of this DbAccess.
+        """
+        self.result_cache.clear()
+        self.invalidate_dimensions()
+        self.cache_state = None
+        self.table_versions = {}
+
+    def _data_version(self) -> int:
+        return self.con.execute('PRAGMA data_version').fetchone()[0]
+
+    def refresh_replica(self):
+        """ Copy the database file into the replica with the backup API """
+        # Taken first so a commit landing mid-copy is copied again next read
+        self.replica_version = self._data_version()
+        self.con.backup(self.replica)
+
+    def _reader(self) -> sqlite3.Connection:
+        """ Connection reads run on, the replica brought up to date when there is one """
+        if self.writer_con is not None:
+            # Reads inside a write see its uncommitted rows
+            return self.writer_con
+        if self.replica is None:
+            return self.con
+        if self.transaction_depth == 0 and self._data_version() != self.replica_version:
+            self.refresh_replica()
+        return self.replica
+
+    def validate_cache(self):
+        """ Drop cached results for tables written since the last check """
+        # data_version moves on commits from other connections and
+        # total_changes on our own, neither reads any table.  Inside a queued
+        # write the writer's uncommitted changes count as well.
+        writer_changes = None if self.writer_con is None else self.writer_con.total_changes
+        state = (self._data_version(), self.con.total_changes, writer_changes)
+        if state == self.cache_state:
+            return
+        try:
+            versions = dict(self._reader().execute('SELECT name, version FROM table_versions').fetchall())
+        except sqlite3.OperationalError:
+            versions = None
+        if versions is None:
+            self.result_cache.clear()
+            self.invalidate_dimensions()
+        else:
+            changed = {name for name, version in versions.items() if self.table_versions.get(name) != version}
+            self.result_cache.invalidate(changed)
+            for table_name in changed:
+                self.invalidate_dimensions(table_name)
+            self.table_versions = versions
+        self.cache_state = state
+
+    def cache_stats(self) -> dict:
+        return self.result_cache.stats()
+
+    def add_query_hook(self, hook):
+        self.query_hooks.append(hook)
+
+    def remove_query_hook(self, hook):
+        self.query_hooks.remove(hook)
+
+    def add_assignment_hook(self, hook):
+        self.assignment_hooks.append(hook)
+
+    def remove_assignment_hook(self, hook):
+        self.assignment_hooks.remove(hook)
+
+    def _record_query(self, sql: str, params, execute_s: float, fetch_s: float, convert_s: float, rows: int):
+        if len(self.query_hooks) == 0:
+            return
+        record = {
+            'sql': sql,
+            'params': params,
+            'execute_ms': execute_s * 1000.0,
+            'fetch_ms': fetch_s * 1000.0,
+            'convert_ms': convert_s * 1000.0,
+            'total_ms': (execute_s + fetch_s + convert_s) * 1000.0,
+            'rows': rows,
+        }
+        for hook in self.query_hooks:
+            hook(record)
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        start = time.perf_counter()
+        cursor = self._write_cursor()
+        cursor.execute(sql, params)
+        if self.replica is not None and self.writer_con is None:
+            self.replica.execute(sql, params)
+        self._record_query(sql, params, time.perf_counter() - start, 0.0, 0.0, cursor.rowcount)
+        return cursor
+
+    def _write_cursor(self) -> sqlite3.Cursor:
+        if self.writer_con is not None:
+            # A replica notices the queue's commit through data_version and
+            # copies the file again, so queued writes are not replayed on it
+            return self.writer_cursor
+        return self.cursor
+
+    def _build_frame(self, cursor: sqlite3.Cursor, rows: list, parse_dates: list = None, dtype: dict = None, convert = None) -> pd.DataFrame:
+        data = pd.DataFrame.from_records(rows, columns=[column[0] for column in cursor.description], coerce_float=True)
+        if dtype:
+            data = data.astype(dtype)
+        for column_name in parse_dates or []:
+            data[column_name] = pd.to_datetime(data[column_name], errors='coerce')
+        if convert is not None:
+            data = convert(data)
+        return data
+
+    def _read_sql(self, sql: str, params: list = None, parse_dates: list = None, dtype: dict = None, convert = None) -> pd.DataFrame:
+        """ read_sql_query in timed steps, convert finishes the frame """
+        start = time.perf_counter()
+        cursor = self._reader().execute(sql, params or [])
+        executed = time.perf_counter()
+        rows = cursor.fetchall()
+        fetched = time.perf_counter()
+        data = self._build_frame(cursor, rows, parse_dates=parse_dates, dtype=dtype, convert=convert)
+        self._record_query(sql, params, executed - start, fetched - executed, time.perf_counter() - fetched, len(rows))
+        return data
 
+    def _read_sql_chunks(self, sql: str, params: list = None, chunk_size: int = EXPORT_CHUNK_SIZE, parse_dates: list = None, dtype: dict = None, convert = None):
+        """ _read_sql as frames of at most chunk_size rows fetched from a cursor of its own
+
+        Only one chunk is held at a time.  An empty result still yields one
+        empty frame so the columns are known.  The query is recorded once the
+        last chunk has been fetched.
+        """
+        start = time.perf_counter()
+        cursor = self._reader().execute(sql, params or [])
+        execute_s = time.perf_counter() - start
+        fetch_s = 0.0
+        convert_s = 0.0
+        row_count = 0
+        try:
+            while True:
+                fetch_start = time.perf_counter()
+                rows = cursor.fetchmany(chunk_size)
+                fetched = time.perf_counter()
+                fetch_s += fetched - fetch_start
+                if len(rows) == 0 and row_count > 0:
+                    break
+                data = self._build_frame(cursor, rows, parse_dates=parse_dates, dtype=dtype, convert=convert)
+                convert_s += time.perf_counter() - fetched
+                row_count += len(rows)
+                yield data
+                if len(rows) == 0:
+                    break
+        finally:
+            cursor.close()
+            self._record_query(sql, params, execute_s, fetch_s, convert_s, row_count)
+
+    def _convert_money(self, data: pd.DataFrame, money_columns: list) -> pd.DataFrame:
+        for column_name in money_columns:
+            if self.integer_cents:
+                data[column_name] = cents_from_amounts(data[column_name])
+            else:
+                data[column_name] = data[column_name].astype(str).apply(Decimal)
+        return data
+
+    def _read_money(self, sql: str, money_columns: list, params: list = None, parse_dates: list = None) -> pd.DataFrame:
+        return self._read_sql(
+            sql,
+            params=params,
+            parse_dates=parse_dates,
+            convert=lambda data: self._convert_money(data, money_columns),
+        )
+
+    def _read_snapshot(self, table: str, where: Where, money_columns: list, parse_dates: list = None) -> pd.DataFrame:
+        """ Rows of table for where from its snapshot, None if where needs SQL """
+        if self.snapshots is None or len(where.params) > 0 or not set(where.clauses) <= set(SNAPSHOT_FILTERS):
+            return None
+        if self.writer_con is not None:
+            # Snapshots only know committed rows
+            return None
+        sql = f'SELECT * FROM {table}'
+        data = self.snapshots.read_table(self.con, table, lambda: self._read_sql(sql, parse_dates=parse_dates))
+        for clause in where.clauses:
+            column_name, value = SNAPSHOT_FILTERS[clause]
+            data = data.loc[data[column_name] == value]
+        return self._convert_money(data.reset_index(drop=True), money_columns)
+
+    def _to_amount(self, value):
+        """ Decimal for SQL from an amount argument in either mode """
+        if self.integer_cents and is_cents(value):
+            return from_cents(value)
+        return value
+
+    @cached_read('statement_transactions', 'statement_predictions')
     def get_statement_transactions(self, 
         include_assigned: bool = True,
         include_deferred: bool = True,
@@ -31,36 +347,110 @@ class DbAccess(object):
         account_id: int = None,
         before_date: np.datetime64 = None,
         after_date: np.datetime64 = None,
-        request_taction_id: int = None) -> pd.DataFrame:
-        
+        request_taction_id: int = None,
+        description_text: str = None,
+        model_hash: str = None) -> pd.DataFrame:
+        """ Statement entries, with model_hash also their stored prediction from that model
+
+        Entries without one have NaN predicted_category_id and
+        prediction_confidence.
+        """
         sql = 'SELECT * FROM statement_transactions'
-        
-        where_list = []
+        params = []
+        if model_hash is not None:
+            sql = '''SELECT statement_transactions.*,
+                    statement_predictions.category_id AS predicted_category_id,
+                    statement_predictions.confidence AS prediction_confidence
+                FROM statement_transactions LEFT JOIN statement_predictions
+                    ON statement_predictions.statement_id = statement_transactions.id
+                    AND statement_predictions.model_hash = ?'''
+            params = [model_hash]
+
+        where = Where()
         if not include_assigned:
-            where_list.append('taction_id IS NULL')
+            where.add('taction_id IS NULL')
         if not include_deferred:
-            where_list.append('deferred = 0')
+            where.add('deferred = 0')
         if amount is not None:
-            where_list.append(f'amount = {amount}')
+            where.add('amount = ?', self._to_amount(amount))
         if account_id is not None:
-            where_list.append(f'account_id = {account_id}')
+            where.add('account_id = ?', account_id)
         if request_taction_id is not None:
-            where_list.append(f'taction_id = {request_taction_id}')
+            where.add('taction_id = ?', request_taction_id)
         if after_date is not None:
-            where_list.append(f"date >= date('{after_date}')")
+            where.add('date >= date(?)', date_param(after_date))
         if before_date is not None:
-            where_list.append(f"date <= date('{before_date}')")
-        sql += generate_where_statement(where_list)
+            where.add('date <= date(?)', date_param(before_date))
+        if description_text is not None:
+            self._add_description_filter(where, 'statement_transactions', description_text)
+        if model_hash is None:
+            data = self._read_snapshot('statement_transactions', where, ['amount'], parse_dates=['date'])
+            if data is not None:
+                return data.sort_values('id', kind='stable').reset_index(drop=True)
+        sql += where.statement()
+        # Keep entry order stable for the positional batch forms
+        sql += ' ORDER BY id'
         
-        data = pd.read_sql_query(
+        return self._read_money(
             sql,
-            self.con,
+            ['amount'],
+            params=params + where.params,
             parse_dates=['date'],
-            dtype={'amount': str},
         )
-        data['amount'] = data['amount'].apply(Decimal)
-        return data
 
+    @cached_read('sub', 'statement_transactions')
+    def get_labeled_statements(self, statement_ids: list = None) -> pd.DataFrame:
+        """ Assigned statement entries whose taction has a single valid, real sub, with its category_id """
+        sql = '''SELECT statement_transactions.*, MIN(sub.category_id) AS category_id
+            FROM statement_transactions JOIN sub ON sub.taction_id = statement_transactions.taction_id
+                AND sub.valid = 1 AND sub.not_real = 0'''
+        if statement_ids is None:
+            chunk_wheres = [Where()]
+        else:
+            chunk_wheres = []
+            for chunk in chunk_values(statement_ids):
+                chunk_where = Where()
+                chunk_where.add_in('statement_transactions.id', chunk)
+                chunk_wheres.append(chunk_where)
+        return pd.concat([
+            self._read_money(
+                sql + chunk_where.statement() + ' GROUP BY statement_transactions.id HAVING COUNT(*) = 1 ORDER BY statement_transactions.id',
+                ['amount'],
+                params=chunk_where.params,
+                parse_dates=['date'],
+            ) for chunk_where in chunk_wheres
+        ], ignore_index=True)
+
+    def get_label_changes(self, after_seq: int) -> tuple:
+        """ Statement ids whose label or features may have changed since after_seq, and the last seq
+
+        The ids are None when the log has been pruned past after_seq.  Not
+        cached, the log has no table version.
+        """
+        first_seq, last_seq = self._reader().execute('SELECT MIN(seq), MAX(seq) FROM statement_label_log').fetchone()
+        if last_seq is None:
+            # Empty log, it carries on from the last seq handed out
+            row = self._reader().execute("SELECT seq FROM sqlite_sequence WHERE name = 'statement_label_log'").fetchone()
+            last_seq = 0 if row is None else row[0]
+            first_seq = last_seq + 1
+        if after_seq + 1 < first_seq:
+            return None, last_seq
+        data = self._read_sql(
+            '''SELECT statement_id AS id FROM statement_label_log
+                WHERE seq > ? AND seq <= ? AND statement_id IS NOT NULL
+            UNION SELECT statement_transactions.id FROM statement_label_log
+                JOIN statement_transactions ON statement_transactions.taction_id = statement_label_log.taction_id
+                WHERE seq > ? AND seq <= ? AND statement_label_log.statement_id IS NULL''',
+            params=[after_seq, last_seq, after_seq, last_seq],
+        )
+        return list(data['id']), last_seq
+
+    @queued_write
+    def prune_label_log(self, through_seq: int):
+        self._execute('DELETE FROM statement_label_log WHERE seq <= ?', (through_seq,))
+        self._commit()
+
+    @cached_read('sub', 'taction', 'statement_transactions')
     def get_transactions(self,
         amount: Decimal = None,
         after_date: np.datetime64 = None,
@@ -70,36 +460,110 @@ class DbAccess(object):
         only_valid: bool = True,
         description_text: str = None,
         taction_id_request: int = None,
-        include_statement_links: bool = False):
-        
-        # amount is the total not the sub
-        subs = self.get_subtotals(
-            only_valid=only_valid,
-        )
-        tactions = self.get_tactions(
+        include_statement_links: bool = False,
+        category_id: int = None,
+        only_unmapped: bool = False):
+        sql, params, parse_dates, convert = self._transactions_query(
+            amount=amount,
             after_date=after_date,
             before_date=before_date,
             account_id=account_id,
+            absolute_value=absolute_value,
             only_valid=only_valid,
-            id_request=taction_id_request,
             description_text=description_text,
-        ).set_index('id')
-        sub_totals = subs[['amount', 'taction_id']].groupby('taction_id').sum().reset_index(drop=False)
+            taction_id_request=taction_id_request,
+            include_statement_links=include_statement_links,
+            category_id=category_id,
+            only_unmapped=only_unmapped,
+        )
+        return self._read_sql(sql, params=params, parse_dates=parse_dates, convert=convert)
+
+    def iter_transactions(self, chunk_size: int = EXPORT_CHUNK_SIZE, **filters):
+        """ get_transactions(**filters) as frames of at most chunk_size rows """
+        sql, params, parse_dates, convert = self._transactions_query(**filters)
+        return self._read_sql_chunks(sql, params=params, chunk_size=chunk_size, parse_dates=parse_dates, convert=convert)
+
+    def _transactions_query(self,
+        amount: Decimal = None,
+        after_date: np.datetime64 = None,
+        before_date: np.datetime64 = None,
+        account_id: int = None,
+        absolute_value: bool = False,
+        only_valid: bool = True,
+        description_text: str = None,
+        taction_id_request: int = None,
+        include_statement_links: bool = False,
+        category_id: int = None,
+        only_unmapped: bool = False) -> tuple:
+        """ SQL, params, parse_dates and convert for get_transactions
+
+        category_id keeps tactions with a valid, real sub in that category.
+        only_unmapped keeps tactions with no linked statement entry and
+        needs include_statement_links.
+        """
+        if only_unmapped and not include_statement_links:
+            raise ValueError('only_unmapped needs include_statement_links')
+
+        # amount is the total not the sub, summed as integer cents so the
+        # comparison against amount is exact
+        sql = 'SELECT sub.taction_id AS taction_id, CAST(SUM(ROUND(sub.amount * 100)) AS INTEGER) AS amount, taction.*'
+        sql += ' FROM sub INNER JOIN taction ON taction.id = sub.taction_id'
+
+        where = Where(['sub.not_real = 0'])
+        if only_valid:
+            where.add('sub.valid = 1')
+            where.add('taction.valid = 1')
+        if after_date is not None:
+            where.add('taction.date >= date(?)', date_param(after_date))
+        if before_date is not None:
+            where.add('taction.date <= date(?)', date_param(before_date))
+        if account_id is not None:
+            where.add('taction.account_id = ?', account_id)
+        if taction_id_request is not None:
+            where.add('taction.id = ?', taction_id_request)
+        if description_text is not None:
+            self._add_description_filter(where, 'taction', description_text)
+        if category_id is not None:
+            where.add('sub.taction_id IN (SELECT taction_id FROM sub WHERE category_id = ? AND valid = 1 AND not_real = 0)', category_id)
+        sql += where.statement()
+        sql += ' GROUP BY sub.taction_id'
+        params = where.params
         if amount is not None:
+            amount = self._to_amount(amount)
             if absolute_value:
-                sub_totals = sub_totals.loc[sub_totals['amount'].abs()==abs(amount), :]
+                sql += ' HAVING ABS(SUM(ROUND(sub.amount * 100))) = ?'
+                params.append(abs(to_cents(amount)))
             else:
-                sub_totals = sub_totals.loc[sub_totals['amount']==amount, :]
-        transactions = sub_totals.join(tactions, on='taction_id', how='inner', lsuffix='_sub')
-        if include_statement_links:
-            statements = self.get_statement_transactions(
-                amount=amount,
-                account_id=account_id,
-                request_taction_id=taction_id_request,
-            ).set_index('taction_id').rename({'id': 'statement_id'}, axis='columns')
-            transactions = transactions.join(statements[['statement_id', 'date']], on='taction_id', how='left', rsuffix='_statement')
-        return transactions
+                sql += ' HAVING SUM(ROUND(sub.amount * 100)) = ?'
+                params.append(to_cents(amount))
 
+        parse_dates = ['date']
+        if include_statement_links:
+            statement_where = Where(['statement_transactions.taction_id = totals.taction_id'])
+            if amount is not None:
+                statement_where.add('statement_transactions.amount = ?', amount)
+            if account_id is not None:
+                statement_where.add('statement_transactions.account_id = ?', account_id)
+            sql = f"SELECT totals.*, statement_transactions.id AS statement_id, statement_transactions.date AS date_statement FROM ({sql}) AS totals"
+            sql += f" LEFT JOIN statement_transactions ON {' AND '.join(statement_where.clauses)}"
+            params += statement_where.params
+            if only_unmapped:
+                sql += ' WHERE statement_transactions.id IS NULL'
+            parse_dates.append('date_statement')
+        sql += ' ORDER BY taction_id'
+
+        def convert(transactions):
+            transactions = transactions.drop('id', axis='columns')
+            if not self.integer_cents:
+                transactions['amount'] = transactions['amount'].apply(from_cents)
+            if include_statement_links:
+                # Nullable ints so every chunk of a streamed read agrees
+                transactions['statement_id'] = transactions['statement_id'].astype('Int64')
+            return transactions
+
+        return sql, params, parse_dates, convert
+
+    @cached_read('sub')
     def get_subtotals(self, 
         amount: Decimal = None,
         absolute_value: bool = False,
@@ -112,39 +576,49 @@ class DbAccess(object):
         only_real: bool = True):
         sql = 'SELECT * FROM sub'
 
-        where_list = []
+        where = Where()
         if amount is not None:
+            amount = self._to_amount(amount)
             if absolute_value:
-                where_list.append(f'amount = abs({abs(amount)})')
+                where.add('amount = abs(?)', abs(amount))
             else:
-                where_list.append(f'amount = {amount}')
+                where.add('amount = ?', amount)
         if only_valid:
-            where_list.append('valid = 1')
+            where.add('valid = 1')
         if only_real:
-            where_list.append('not_real = 0')
+            where.add('not_real = 0')
         if taction_id is not None:
-            where_list.append(f'taction_id = {taction_id}')
+            where.add('taction_id = ?', taction_id)
         if category_id is not None:
-            where_list.append(f'category_id = {category_id}')
-        if in_taction_list is not None:
-            str_list = [str(item) for item in in_taction_list]
-            where_list.append(f"taction_id IN ({', '.join(str_list)})")
+            where.add('category_id = ?', category_id)
         if after_date is not None:
-            where_list.append(f"date >= date('{after_date}')")
+            where.add('date >= date(?)', date_param(after_date))
         if before_date is not None:
-            where_list.append(f"date <= date('{before_date}')")
-        sql += generate_where_statement(where_list)
-        #print(sql)
-
-        data = pd.read_sql_query(
-            sql,
-            self.con,
-            dtype={'amount': str},
-            parse_dates=['date'],
-        )
-        data['amount'] = data['amount'].apply(Decimal)
-        return data
-
+            where.add('date <= date(?)', date_param(before_date))
+
+        # Long taction lists are read in chunks of bound IN lists
+        if in_taction_list is None:
+            data = self._read_snapshot('sub', where, ['amount'], parse_dates=['date'])
+            if data is not None:
+                return data
+            chunk_wheres = [where]
+        else:
+            chunk_wheres = []
+            for chunk in chunk_values(in_taction_list):
+                chunk_where = where.copy()
+                chunk_where.add_in('taction_id', chunk)
+                chunk_wheres.append(chunk_where)
+
+        return pd.concat([
+            self._read_money(
+                sql + chunk_where.statement(),
+                ['amount'],
+                params=chunk_where.params,
+                parse_dates=['date'],
+            ) for chunk_where in chunk_wheres
+        ], ignore_index=True)
+
+    @cached_read('taction')
     def get_tactions(self, 
         after_date: np.datetime64 = None,
         before_date: np.datetime64 = None,
@@ -154,124 +628,148 @@ class DbAccess(object):
         id_request: int = None) -> pd.DataFrame:
         sql = 'SELECT * FROM taction'
 
-        where_list = []
+        where = Where()
         if after_date is not None:
-            where_list.append(f"date >= date('{after_date}')")
+            where.add('date >= date(?)', date_param(after_date))
         if before_date is not None:
-            where_list.append(f"date <= date('{before_date}')")
+            where.add('date <= date(?)', date_param(before_date))
         if only_valid:
-            where_list.append(f'valid = 1')
+            where.add('valid = 1')
         if account_id is not None:
-            where_list.append(f'account_id = {account_id}')
+            where.add('account_id = ?', account_id)
         if id_request is not None:
-            where_list.append(f'id = {id_request}')
+            where.add('id = ?', id_request)
         if description_text is not None:
-            where_list.append(f"description LIKE '%{description_text}%'")
-        sql += generate_where_statement(where_list)
-        print(sql)
-
-        data = pd.read_sql_query(
-            sql,
-            self.con,
-            parse_dates=['date'],
-        )
-        return data
+            self._add_description_filter(where, 'taction', description_text)
+        data = self._read_snapshot('taction', where, [], parse_dates=['date'])
+        if data is not None:
+            return data
+        sql += where.statement()
+
+        return self._read_sql(sql, params=where.params, parse_dates=['date'])
+
+    def _add_description_filter(self, where: Where, table: str, text: str):
+        """ Rows whose description contains text, through the FTS index """
+        if len(text) >= MIN_FTS_LENGTH:
+            where.add(f'{table}.id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)', fts_phrase(text))
+        else:
+            where.add(f'{table}.description LIKE ?', f'%{text}%')
+
+    def _search_descriptions(self, table: str, text: str, limit: int, where: Where) -> tuple:
+        """ SQL and params for rows matching text, best matches first """
+        if len(text) >= MIN_FTS_LENGTH:
+            sql = f'SELECT {table}.*, {table}_fts.rank AS rank FROM {table}_fts INNER JOIN {table} ON {table}.id = {table}_fts.rowid'
+            where.add(f'{table}_fts MATCH ?', fts_phrase(text))
+            order = f' ORDER BY {table}_fts.rank, {table}.date DESC'
+        else:
+            sql = f'SELECT {table}.*, NULL AS rank FROM {table}'
+            where.add(f'{table}.description LIKE ?', f'%{text}%')
+            order = f' ORDER BY {table}.date DESC'
+        return sql + where.statement() + order + ' LIMIT ?', where.params + [limit]
+
+    @cached_read('taction')
+    def search_tactions(self, text: str, limit: int = 100, only_valid: bool = True) -> pd.DataFrame:
+        """ Tactions whose description contains text, ranked by bm25 """
+        where = Where()
+        if only_valid:
+            where.add('taction.valid = 1')
+        sql, params = self._search_descriptions('taction', text, limit, where)
+        return self._read_sql(sql, params=params, parse_dates=['date'])
+
+    @cached_read('statement_transactions')
+    def search_statement_transactions(self, text: str, limit: int = 100, account_id: int = None) -> pd.DataFrame:
+        """ Statement entries whose description contains text, ranked by bm25 """
+        where = Where()
+        if account_id is not None:
+            where.add('statement_transactions.account_id = ?', account_id)
+        sql, params = self._search_descriptions('statement_transactions', text, limit, where)
+        return self._read_money(sql, ['amount'], params=params, parse_dates=['date'])
 
+    @cached_read('category')
     def get_categories(self) -> pd.DataFrame:
-        return pd.read_sql_query(
-            'SELECT * FROM category',
-            self.con
-        )
+        return self._read_sql('SELECT * FROM category')
 
+    @cached_read('budget_profile')
     def get_budget_profiles(self, budget_id: int = None) -> pd.DataFrame:
         sql = 'SELECT * FROM budget_profile'
-        where_list = []
+        where = Where()
         if budget_id is not None:
-            where_list.append(f'budget_id = {budget_id}')
-        sql += generate_where_statement(where_list)
-        value_columns = {column_name: str for column_name in self.get_budget_profile_column_names() if 'month' in column_name}
-        data = pd.read_sql_query(
+            where.add('budget_id = ?', budget_id)
+        sql += where.statement()
+        value_columns = [column_name for column_name in self.get_budget_profile_column_names() if 'month' in column_name]
+        return self._read_money(
             sql,
-            self.con,
-            dtype=value_columns,
+            value_columns,
+            params=where.params,
         )
-        for column_name in value_columns:
-            data[column_name] = data[column_name].apply(Decimal)
-        return data
 
+    @cached_read('method')
     def get_methods(self) -> pd.DataFrame:
-        return pd.read_sql_query(
-            'SELECT * from method',
-            self.con
-        )
+        return self._read_sql('SELECT * from method')
 
+    @cached_read('account')
     def get_accounts(self, account_id: int = None, only_valid: bool = True, only_visible: bool = True) -> pd.DataFrame:
         sql = 'SELECT * FROM account'
-        where_list = []
+        where = Where()
         if only_valid:
-            where_list.append('valid = 1')
+            where.add('valid = 1')
         if only_visible:
-            where_list.append('visibility = 1')
+            where.add('visibility = 1')
         if account_id is not None:
-            where_list.append(f'id = {account_id}')
-        sql += generate_where_statement(where_list)
-        data = pd.read_sql_query(
+            where.add('id = ?', account_id)
+        sql += where.statement()
+        return self._read_money(
             sql,
-            self.con,
-            dtype={'balance': str},
+            ['balance'],
+            params=where.params,
         )
-        data['balance'] = data['balance'].apply(Decimal)
-        return data
 
+    @cached_read('budget')
     def get_budgets(self, budget_id: int = None, only_visible: bool = True) -> pd.DataFrame:
         sql = 'SELECT * FROM budget'
-        where_list = []
+        where = Where()
         if budget_id is not None:
-            where_list.append(f'id = {budget_id}')
+            where.add('id = ?', budget_id)
         if only_visible:
-            where_list.append('visibility = 1')
-        sql += generate_where_statement(where_list)
-        data = pd.read_sql_query(
+            where.add('visibility = 1')
+        sql += where.statement()
+        return self._read_money(
             sql,
-            self.con,
-            dtype={'increment': str, 'balance': str}
+            ['balance', 'increment'],
+            params=where.params,
         )
-        data['balance'] = data['balance'].apply(Decimal)
-        data['increment'] = data['increment'].apply(Decimal)
-        return data
 
+    @cached_read('hsa_distributions')
     def get_hsa_distributions(self, amount: Decimal = None, source_id: str = None) -> pd.DataFrame:
         sql = 'SELECT * FROM hsa_distributions'
-        where_list = []
+        where = Where()
         if amount is not None:
-            where_list.append(f'amount = {amount}')
+            where.add('amount = ?', self._to_amount(amount))
         if source_id is not None:
-            where_list.append(f"source_id = '{source_id}'")
-        sql += generate_where_statement(where_list)
-        data = pd.read_sql_query(
+            where.add('source_id = ?', source_id)
+        sql += where.statement()
+        return self._read_money(
             sql,
-            self.con,
-            dtype={'amount': str},
+            ['amount'],
+            params=where.params,
             parse_dates=['date'],
         )
-        data['amount'] = data['amount'].apply(Decimal)
-        return data
 
+    @cached_read('budget_adjustments')
     def get_budget_adjustments(self, budget_id: int = None) -> pd.DataFrame:
         sql = 'SELECT * FROM budget_adjustments'
-        where_list = []
+        where = Where()
         if budget_id is not None:
-            where_list.append(f'budget_id = {budget_id}')
-        sql += generate_where_statement(where_list)
-        data = pd.read_sql_query(
+            where.add('budget_id = ?', budget_id)
+        sql += where.statement()
+        return self._read_money(
             sql,
-            self.con,
-            dtype={'amount': str},
+            ['amount'],
+            params=where.params,
             parse_dates=['date'],
         )
-        data['amount'] = data['amount'].apply(Decimal)
-        return data
 
+    @queued_write
     def add_taction(self, date, transfer: bool, account_id: int, method_id: int, description: str, receipt: bool, valid: bool, not_real: bool):
         fields = [
             'id',
@@ -317,12 +815,30 @@ class DbAccess(object):
         return new_id
 
     def _insert(self, table: str, fields: list, values: list):
-        fields_str = ', '.join(fields)
-        str_values = [str(value) for value in values]
-        values_str = "\"" + "\", \"".join(str_values) + "\""
-        self.cursor.execute(f"INSERT INTO {table} ({fields_str}) VALUES ({values_str})")
-        self.con.commit()
+        self._insert_many(table, fields, [values])
 
+    def _insert_many(self, table: str, fields: list, rows: list, or_replace: bool = False):
+        fields_str = ', '.join(fields)
+        values_str = ', '.join(['?'] * len(fields))
+        # Values have always been stored as their text, column affinity
+        # converts numbers back
+        str_rows = [
+            [str(self._to_amount(value) if field in MONEY_FIELDS else value) for field, value in zip(fields, values)]
+            for values in rows
+        ]
+        verb = 'INSERT OR REPLACE' if or_replace else 'INSERT'
+        sql = f"{verb} INTO {table} ({fields_str}) VALUES ({values_str})"
+        start = time.perf_counter()
+        cursor = self._write_cursor()
+        cursor.executemany(sql, str_rows)
+        if self.replica is not None and self.writer_con is None:
+            self.replica.executemany(sql, str_rows)
+        self._record_query(sql, str_rows, time.perf_counter() - start, 0.0, 0.0, cursor.rowcount)
+        self._commit()
+        if table in DIMENSION_TABLES:
+            self.invalidate_dimensions(table)
+
+    @queued_write
     def update_account(self, amount: Decimal, account: str):
         self._update_add(
             'account',
@@ -343,89 +859,139 @@ class DbAccess(object):
     def budget_translate(self, method, request: str):
         return self.translate(method, 'budget', request)
 
+    def get_dimension_maps(self, name_type: str) -> dict:
+        """ {'id': name -> id, 'name': id -> name} for a dimension table """
+        if name_type not in self.dimension_maps:
+            type_map = {
+                'account': self.get_accounts,
+                'method': self.get_methods,
+                'category': self.get_categories,
+                'budget': self.get_budgets,
+            }
+            data = type_map[name_type]()
+            # First match wins, as the row filters did
+            maps = {
+                'id': data.drop_duplicates('name').set_index('name')['id'].to_dict(),
+                'name': data.drop_duplicates('id').set_index('id')['name'].to_dict(),
+            }
+            if name_type == 'category':
+                maps['budget_id'] = data.drop_duplicates('id').set_index('id')['budget_id'].to_dict()
+            self.dimension_maps[name_type] = maps
+        return self.dimension_maps[name_type]
+
+    def invalidate_dimensions(self, table_name: str = None):
+        if table_name is None:
+            self.dimension_maps = {}
+        else:
+            self.dimension_maps.pop(table_name, None)
+
     def translate(self, match: str, name_type: str, request: str) -> int:
-        type_map = {
-            'account': self.get_accounts,
-            'method': self.get_methods,
-            'category': self.get_categories,
-            'budget': self.get_budgets,
-        }
-        func = type_map[name_type]
-        data = func()
-        if request == 'id':
-            result = data[data['name'] == match]['id']
-        elif request == 'name':
-            result = data[data['id'] == match]['name']
-        return result.values[0]
+        return self.get_dimension_maps(name_type)[request][match]
+
+    def translate_series(self, matches: pd.Series, name_type: str, request: str) -> pd.Series:
+        return matches.map(self.get_dimension_maps(name_type)[request])
     
     def _update_add(self, table_name: str, field_name: str, amount: Decimal, item_id: int):
-        self.cursor.execute(f"UPDATE {table_name} SET {field_name}={field_name}+{amount} WHERE id={item_id}")
-        self.con.commit()
+        self._execute(f"UPDATE {table_name} SET {field_name}={field_name}+? WHERE id=?", (self._to_amount(amount), item_id))
+        self._commit()
 
+    @queued_write
     def add_transaction(self, date, account: str, method: str, description: str, receipt: bool, amount: Decimal, subs: list, transfer: bool = False):
-        new_id = self.add_taction(
-            date,
-            transfer,
-            self.account_translate(account, 'id'),
-            self.method_translate(method, 'id'),
-            description,
-            receipt,
-            True,
-            False,
-        )
-        self.update_account(amount, account)
-        for sub in subs:
-            sub_amount = sub[0]
-            category_id = self.category_translate(sub[1], 'id')
-            self.add_sub(
-                sub_amount,
-                category_id,
-                new_id,
+        with self.transaction():
+            new_id = self.add_taction(
+                date,
+                transfer,
+                self.account_translate(account, 'id'),
+                self.method_translate(method, 'id'),
+                description,
+                receipt,
                 True,
                 False,
-                date,
             )
-            self.update_budget(sub_amount, category_id)
+            self.update_account(amount, account)
+            first_sub_id = self.allocate_ids('sub', len(subs))
+            sub_rows = []
+            for index, sub in enumerate(subs):
+                sub_rows.append(self._sub_values(
+                    first_sub_id + index,
+                    sub[0],
+                    self.category_translate(sub[1], 'id'),
+                    new_id,
+                    True,
+                    False,
+                    date,
+                ))
+            self._insert_many('sub', SUB_FIELDS, sub_rows)
+            for sub in subs:
+                self.update_budget(sub[0], self.category_translate(sub[1], 'id'))
         return new_id
 
+    @queued_write
     def add_transfer(self, date, withdrawal_account: str, deposit_account: str, description, receipt, amount: Decimal):
-        withdraw_amount = Decimal('-1.00') * amount
-        self.add_transaction(
-            date,
-            withdrawal_account,
-            'Automated',
-            description,
-            receipt,
-            withdraw_amount,
-            [(withdraw_amount, 'Transfer')],
-            transfer=True,
-        )
-        self.add_transaction(
-            date,
-            deposit_account,
-            'Automated',
-            description,
-            receipt,
-            amount,
-            [(amount, 'Transfer')],
-            transfer=True,
+        with self.transaction():
+            withdraw_amount = -amount
+            self.add_transaction(
+                date,
+                withdrawal_account,
+                'Automated',
+                description,
+                receipt,
+                withdraw_amount,
+                [(withdraw_amount, 'Transfer')],
+                transfer=True,
+            )
+            self.add_transaction(
+                date,
+                deposit_account,
+                'Automated',
+                description,
+                receipt,
+                amount,
+                [(amount, 'Transfer')],
+                transfer=True,
+            )
+
+    @queued_write
+    def allocate_ids(self, table: str, count: int = 1) -> int:
+        """ Reserve count consecutive ids in table and return the first
+
+        The sequence update takes the write lock until the caller's insert
+        commits, so concurrent sessions never get the same id.  Rows added
+        by other tools are respected through MAX(id), which is an index
+        lookup.
+        """
+        self._execute(
+            f'UPDATE id_sequence SET next_id = MAX(next_id, (SELECT IFNULL(MAX(id) + 1, 0) FROM {table})) + ? WHERE name = ?',
+            (count, table),
         )
+        next_id = self._execute('SELECT next_id FROM id_sequence WHERE name = ?', (table,)).fetchone()[0]
+        return next_id - count
 
+    @queued_write
     def get_next_sub_id(self):
-        return self.get_subtotals(only_valid=False)['id'].max() + 1
+        return self.allocate_ids('sub')
 
+    @queued_write
     def add_sub(self, amount: Decimal, category_id: int, taction_id: int, valid: bool, not_real: bool, date):
-        fields = [
-            'id',
-            'amount',
-            'category_id',
-            'taction_id',
-            'valid',
-            'not_real',
-            'date',
-        ]
         new_id = self.get_next_sub_id()
+        self._insert('sub', SUB_FIELDS, self._sub_values(
+            new_id,
+            amount,
+            category_id,
+            taction_id,
+            valid,
+            not_real,
+            date,
+        ))
+        return new_id
+
+    @queued_write
+    def update_sub(self, sub_id: int, valid: bool, not_real: bool):
+        with self.transaction():
+            self._update('sub', 'valid', 1 if valid else 0, sub_id)
+            self._update('sub', 'not_real', 1 if not_real else 0, sub_id)
 
+    def _sub_values(self, new_id: int, amount: Decimal, category_id: int, taction_id: int, valid: bool, not_real: bool, date) -> list:
         if valid:
             valid_int = 1
         else:
@@ -435,7 +1001,7 @@ class DbAccess(object):
         else:
             not_real_int = 0
 
-        self._insert('sub', fields, [
+        return [
             new_id,
             amount,
             category_id,
@@ -443,15 +1009,17 @@ class DbAccess(object):
             valid_int,
             not_real_int,
             date,
-        ])
-        return new_id
+        ]
 
+    @queued_write
     def get_next_taction_id(self):
-        return self.get_tactions(only_valid=False)['id'].max() + 1
+        return self.allocate_ids('taction')
 
+    @queued_write
     def get_next_statement_transaction_id(self):
-        return self.get_statement_transactions()['id'].max() + 1
+        return self.allocate_ids('statement_transactions')
 
+    @queued_write
     def update_budget(self, amount: Decimal, category_id: int):
         self._update_add(
             'budget',
@@ -460,6 +1028,7 @@ class DbAccess(object):
             self.get_budget_from_category(category_id),
         )
 
+    @queued_write
     def update_budget_by_budget(self, amount: Decimal, budget_id: int):
         self._update_add(
             'budget',
@@ -469,15 +1038,20 @@ class DbAccess(object):
         )
 
     def get_budget_from_category(self, category_id: int) -> int:
-        categories = self.get_categories()
-        return categories[categories['id'] == category_id]['budget_id'].values[0]
+        return self.get_dimension_maps('category')['budget_id'][category_id]
+
+    def get_budgets_from_categories(self, category_ids: pd.Series) -> pd.Series:
+        return category_ids.map(self.get_dimension_maps('category')['budget_id'])
 
+    @queued_write
     def defer_statement(self, statement_id: int):
         self._update('statement_transactions', 'deferred', 1, statement_id)
 
+    @queued_write
     def undefer_statement(self, statement_id: int):
         self._update('statement_transactions', 'deferred', 0, statement_id)
 
+    @queued_write
     def assign_statement_entry(self, entry_id: int, taction_id: int):
         self._update(
             'statement_transactions',
@@ -485,22 +1059,52 @@ class DbAccess(object):
             taction_id,
             entry_id,
         )
+        for hook in self.assignment_hooks:
+            hook(entry_id, taction_id)
 
     def _update(self, table_name: str, field_name: str, in_new_value, item_id: int, use_quotes: bool = False, id_field='id', id_quotes: bool = False):
-        if use_quotes:
-            new_value = f"'{in_new_value}'"
+        if use_quotes and in_new_value is not None:
+            new_value = str(in_new_value)
+        elif field_name in MONEY_FIELDS:
+            new_value = self._to_amount(in_new_value)
         else:
             new_value = in_new_value
         if id_quotes:
-            new_id = f"'{item_id}'"
+            new_id = str(item_id)
         else:
             new_id = item_id
-        if in_new_value is None:
-            self.cursor.execute(f"UPDATE {table_name} SET {field_name} = ? WHERE {id_field}={new_id}", (None,))
-        else:
-            self.cursor.execute(f"UPDATE {table_name} SET {field_name}={new_value} WHERE {id_field}={new_id}")
-        self.con.commit()
+        self._execute(f"UPDATE {table_name} SET {field_name} = ? WHERE {id_field} = ?", (new_value, new_id))
+        self._commit()
+        if table_name in DIMENSION_TABLES:
+            self.invalidate_dimensions(table_name)
+
+    @queued_write
+    def put_statement_predictions(self, model_hash: str, statement_ids: list, category_ids: list, confidences: list):
+        """ Store model_hash's predictions and drop every other model's
+
+        Predictions for entries that have since been assigned or deleted go
+        too.
+        """
+        self._execute(
+            '''DELETE FROM statement_predictions WHERE model_hash != ?
+                OR statement_id IN (SELECT id FROM statement_transactions WHERE taction_id IS NOT NULL)
+                OR statement_id NOT IN (SELECT id FROM statement_transactions)''',
+            (model_hash,),
+        )
+        self._insert_many(
+            'statement_predictions',
+            ['statement_id', 'model_hash', 'category_id', 'confidence'],
+            [[int(statement_id), model_hash, int(category_id), float(confidence)] for statement_id, category_id, confidence in zip(statement_ids, category_ids, confidences)],
+            or_replace=True,
+        )
 
+    @queued_write
+    def delete_statement_transaction(self, statement_id: int):
+        self._execute('DELETE FROM statement_transactions WHERE id = ?', (statement_id,))
+        self._execute('DELETE FROM statement_predictions WHERE statement_id = ?', (statement_id,))
+        self._commit()
+
+    @queued_write
     def add_statement_transaction(self, date, month:int, year:int, account_id:int, amount:Decimal, description:str = None):
         fields = [
             'id',
@@ -524,34 +1128,37 @@ class DbAccess(object):
             values.append(description)
         self._insert('statement_transactions', fields, values)
 
+    @queued_write
     def delete_transaction(self, transaction_id: int):
-        statements = self.get_statement_transactions(request_taction_id=transaction_id)
-        for statement_id in list(statements['id']):
-            self._update('statement_transactions', 'taction_id', None, statement_id)
-            print(f'Reset statement {statement_id}')
-        subs = self.get_subtotals(taction_id=transaction_id)
-        amount = Decimal('0.00')
-        for sub in subs.to_dict(orient='records'):
-            if sub['valid'] != 1:
-                raise ValueError('Sub was not valid')
-            sub_amount = sub['amount']
-            amount += sub_amount
-            self.update_budget(Decimal('-1.00')*sub_amount, sub['category_id'])
+        with self.transaction():
+            statements = self.get_statement_transactions(request_taction_id=transaction_id)
+            for statement_id in list(statements['id']):
+                self._update('statement_transactions', 'taction_id', None, statement_id)
+                print(f'Reset statement {statement_id}')
+            subs = self.get_subtotals(taction_id=transaction_id)
+            amount = Decimal('0.00')
+            for sub in subs.to_dict(orient='records'):
+                if sub['valid'] != 1:
+                    raise ValueError('Sub was not valid')
+                sub_amount = self._to_amount(sub['amount'])
+                amount += sub_amount
+                self.update_budget(Decimal('-1.00')*sub_amount, sub['category_id'])
+                self._update(
+                    'sub', 'valid', 0, sub['id']
+                )
+                print(f"Invalidating sub {sub['id']}")
+            account_id = self.get_tactions(id_request=transaction_id)['account_id'].values[0]
+            taction_valid = self.get_tactions(id_request=transaction_id)['valid'].values[0]
+            if taction_valid != 1:
+                raise ValueError('taction was not valid')
+            self.update_account(Decimal('-1.00')*amount, self.account_translate(account_id, 'name'))
             self._update(
-                'sub', 'valid', 0, sub['id']
+                'taction', 'valid', 0, transaction_id
             )
-            print(f"Invalidating sub {sub['id']}")
-        account_id = self.get_tactions(id_request=transaction_id)['account_id'].values[0]
-        taction_valid = self.get_tactions(id_request=transaction_id)['valid'].values[0]
-        if taction_valid != 1:
-            raise ValueError('taction was not valid')
-        self.update_account(Decimal('-1.00')*amount, self.account_translate(account_id, 'name'))
-        self._update(
-            'taction', 'valid', 0, transaction_id
-        )
 
+    @queued_write
     def add_budget(self, name: str, balance: Decimal, purpose: str, update_frequency: str, update_amount: Decimal) -> int:
-        new_id = self.get_budgets()['id'].max() + 1
+        new_id = self.allocate_ids('budget')
         self._insert(
             'budget',
             [
@@ -577,8 +1184,9 @@ class DbAccess(object):
         )
         return new_id
 
+    @queued_write
     def add_category(self, name: str, budget_name: str):
-        new_id = self.get_categories()['id'].max() + 1
+        new_id = self.allocate_ids('category')
         budget_id = self.budget_translate(budget_name, 'id')
         self._insert(
             'category',
@@ -601,33 +1209,36 @@ class DbAccess(object):
         )
         return new_id
 
+    @queued_write
     def assign_hsa_receipt(self, receipt_path: str, distribution_id: int):
         self._update('hsa_distributions', 'receipt_path', receipt_path, distribution_id, use_quotes=True)
 
+    @queued_write
     def assign_hsa_transaction_distribution(self, transaction_id: str, distribution_id: int):
         self._update('hsa_transactions', 'distribution_taction_id', distribution_id, transaction_id, id_quotes=True)
 
+    @queued_write
     def assign_hsa_transaction_expense(self, transaction_id: str, expense_id: int):
         self._update('hsa_transactions', 'expense_taction_id', expense_id, transaction_id, id_quotes=True)
 
+    @queued_write
     def assign_hsa_transaction_receipt(self, transaction_id: str, receipt_path: str):
         self._update('hsa_transactions', 'receipt_path', receipt_path, transaction_id, id_quotes=True, use_quotes=True)
 
     def get_hsa_transaction_ids(self):
         sql = 'SELECT * FROM hsa_transactions'
-        return list(pd.read_sql_query(sql, self.con)['id'])
+        return list(self._read_sql(sql)['id'])
     
+    @cached_read('hsa_transactions')
     def get_hsa_transactions(self):
         sql = 'SELECT * FROM hsa_transactions'
-        data = pd.read_sql_query(
+        return self._read_money(
             sql,
-            self.con,
-            dtype={'amount': str},
+            ['amount'],
             parse_dates=['date'],
         )
-        data['amount'] = data['amount'].apply(Decimal)
-        return data
     
+    @queued_write
     def add_hsa_transaction(self, date, id: str, amount: Decimal):
         self._insert(
             'hsa_transactions',
@@ -643,8 +1254,9 @@ class DbAccess(object):
             ]
         )
     
+    @queued_write
     def add_hsa_distribution(self, date, person: str, merchant: str, amount: Decimal, description: str, expense_taction_id: int, distribution_taction_id: int, receipt_path: str, source_id: str, hsa_debit: bool = False, dependent_care: bool = False):
-        new_id = self.get_hsa_distributions()['id'].max() + 1
+        new_id = self.allocate_ids('hsa_distributions')
         if hsa_debit:
             hsa_debit_int = 1
         else:
@@ -689,6 +1301,7 @@ class DbAccess(object):
     def get_budget_profile_column_names(self):
         return ['budget_id'] + [f'month_{i}' for i in range(1,13)]
     
+    @queued_write
     def add_budget_profile(self, budget_id: int, values: list):        
         column_names = self.get_budget_profile_column_names()
         self._insert(
@@ -699,21 +1312,19 @@ class DbAccess(object):
 
     def get_hsa_paths(self) -> dict:
         sql = 'SELECT * FROM hsa_receipt_paths'
-        return pd.read_sql_query(sql, self.con).set_index('name').to_dict()['path']
+        return self._read_sql(sql).set_index('name').to_dict()['path']
 
     def get_budget_update_date(self) -> datetime.date:
-        sql = "SELECT * FROM important_dates WHERE name=\"last_budget_update\""
-        return datetime.datetime.utcfromtimestamp(int(pd.read_sql_query(sql, self.con, parse_dates=['date'])['date'].values[0])/1e9).date()
+        sql = 'SELECT * FROM important_dates WHERE name = ?'
+        return datetime.datetime.utcfromtimestamp(int(self._read_sql(sql, params=['last_budget_update'], parse_dates=['date'])['date'].values[0])/1e9).date()
 
+    @queued_write
     def update_budget_update_date(self, new_date: datetime.date):
-        self._update('important_dates', 'date', new_date, "\"last_budget_update\"", use_quotes=True, id_field='name')
+        self._update('important_dates', 'date', new_date, 'last_budget_update', use_quotes=True, id_field='name')
 
+    @queued_write
     def add_budget_adjustment(self, amount: Decimal, budget_id: int, transfer: bool = False, periodic_update: bool = True) -> int:
-        ids = self.get_budget_adjustments()['id'].astype(int)
-        if len(ids) < 1:
-            new_id = 0
-        else:
-            new_id = ids.max() + 1
+        new_id = self.allocate_ids('budget_adjustments')
         if transfer:
             transfer_int = 1
         else:
@@ -744,20 +1355,26 @@ class DbAccess(object):
         )
         return new_id
 
+    @queued_write
     def adjust_budget(self, increment: Decimal, budget_id: int):
-        new_id = self.add_budget_adjustment(increment, budget_id)
-        self.update_budget_by_budget(increment, budget_id)
+        with self.transaction():
+            new_id = self.add_budget_adjustment(increment, budget_id)
+            self.update_budget_by_budget(increment, budget_id)
         return new_id
 
+    @queued_write
     def update_budgets(self):
         budget_dicts = self.get_budgets().to_dict(orient='records')
-        for budget_info in budget_dicts:
-            increment = budget_info['increment']
-            if increment != ZERO and budget_info['valid'] == 1:
-                budget_id = budget_info['id']
-                increment = get_monthly_budget_increment(budget_info)
-                self.adjust_budget(increment, budget_id)
-
+        with self.transaction():
+            for budget_info in budget_dicts:
+                increment = budget_info['increment']
+                if increment != ZERO and budget_info['valid'] == 1:
+                    budget_info['increment'] = self._to_amount(increment)
+                    budget_id = budget_info['id']
+                    increment = get_monthly_budget_increment(budget_info)
+                    self.adjust_budget(increment, budget_id)
+
+    @queued_write
     def set_budget_increment(self, increment: Decimal, budget_id: int):
         self._update('budget', 'increment', increment, budget_id)
 
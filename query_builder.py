@@ -0,0 +1,77 @@
+""" Parameterized SQL building
+
+Values are always bound, never pasted into the SQL text, so the text only
+depends on which filters are used.  That keeps sqlite3's statement cache
+hitting on repeated lookups and keeps quotes in descriptions harmless.
+"""
+
+from decimal import Decimal
+
+import sqlite3
+import numpy as np
+
+# Amounts are bound as their exact text, the decimal(10,2) column affinity
+# turns them back into numbers for comparisons and arithmetic
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(np.bool_, int)
+
+IN_CHUNK_SIZE = 512
+
+def generate_where_statement(where_list: list) -> str:
+    if len(where_list) > 0:
+        return f" WHERE {' AND '.join(where_list)}"
+    else:
+        return ""
+
+def date_param(value) -> str:
+    # Matches the text the date() comparisons have always been given
+    return str(value)
+
+def fts_phrase(text: str) -> str:
+    """ text as a single FTS5 phrase, so its punctuation is not query syntax """
+    return '"' + text.replace('"', '""') + '"'
+
+def chunk_values(values, chunk_size: int = IN_CHUNK_SIZE) -> list:
+    """ Unique values split into lists no longer than chunk_size """
+    unique_values = list(dict.fromkeys(values))
+    if len(unique_values) == 0:
+        return [[]]
+    return [unique_values[i:i+chunk_size] for i in range(0, len(unique_values), chunk_size)]
+
+def padded_length(length: int) -> int:
+    """ Round IN list lengths up to a power of two to bound distinct SQL texts """
+    padded = 1
+    while padded < length:
+        padded *= 2
+    return padded
+
+class Where(object):
+    """ WHERE clauses with their bound parameters """
+
+    def __init__(self, clauses: list = None, params: list = None):
+        self.clauses = list(clauses or [])
+        self.params = list(params or [])
+
+    def __len__(self):
+        return len(self.clauses)
+
+    def add(self, clause: str, *params):
+        self.clauses.append(clause)
+        self.params.extend(params)
+
+    def add_in(self, column: str, values: list):
+        if len(values) == 0:
+            self.clauses.append(f'{column} IN ()')
+            return
+        # Repeating the last value does not change the IN result
+        values = list(values) + [values[-1]] * (padded_length(len(values)) - len(values))
+        self.clauses.append(f"{column} IN ({', '.join(['?'] * len(values))})")
+        self.params.extend(values)
+
+    def copy(self):
+        return Where(self.clauses, self.params)
+
+    def statement(self) -> str:
+        return generate_where_statement(self.clauses)
@@ -0,0 +1,39 @@
+""" Query instrumentation
+
+DbAccess hands every statement it runs to its query hooks as a dict with the
+SQL, bound params, execute, fetch and conversion times in milliseconds and the
+rows returned or changed.  QueryLog is the hook behind the query stats panel.
+"""
+
+import pandas as pd
+
+TIMING_FIELDS = ['execute_ms', 'fetch_ms', 'convert_ms', 'total_ms']
+
+class QueryLog(object):
+    """ Query records since the last clear, oldest dropped past max_records """
+
+    def __init__(self, max_records: int = 1000):
+        self.max_records = max_records
+        self.records = []
+        self.dropped = 0
+
+    def __call__(self, record: dict):
+        self.records.append(record)
+        if len(self.records) > self.max_records:
+            self.records.pop(0)
+            self.dropped += 1
+
+    def clear(self):
+        self.records = []
+        self.dropped = 0
+
+    def totals(self) -> dict:
+        totals = {'queries': len(self.records) + self.dropped, 'rows': sum(record['rows'] for record in self.records)}
+        for field in TIMING_FIELDS:
+            totals[field] = sum(record[field] for record in self.records)
+        return totals
+
+    def slowest(self, count: int = 10) -> pd.DataFrame:
+        data = pd.DataFrame(self.records, columns=['sql', 'params', 'rows'] + TIMING_FIELDS)
+        data['params'] = data['params'].astype(str)
+        return data.sort_values('total_ms', ascending=False).head(count).reset_index(drop=True)
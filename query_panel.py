@@ -0,0 +1,18 @@
+""" Query stats sidebar panel """
+
+import streamlit as stl
+
+from newdb_access import DbAccess
+from query_log import QueryLog
+
+def view_query_stats(st: stl, db: DbAccess, query_log: QueryLog):
+    st.markdown('## Query Stats')
+    totals = query_log.totals()
+    st.markdown(f"""{totals['queries']} queries this rerun, {totals['rows']} rows, {totals['total_ms']:.1f} ms
+- Execute: {totals['execute_ms']:.1f} ms
+- Fetch: {totals['fetch_ms']:.1f} ms
+- Conversion: {totals['convert_ms']:.1f} ms""")
+    cache = db.cache_stats()
+    st.markdown(f"Result cache this session: {cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries")
+    st.markdown('### Slowest Queries')
+    st.write(query_log.slowest())
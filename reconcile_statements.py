@@ -6,7 +6,7 @@ import streamlit as stl
 import pandas as pd
 
 from db_access import DbAccess
-from ml_statement import predict_category, train_model
+from ml_statement import predict_categories, train_model
 
 FOURTEEN_DAYS = pd.Timedelta(days=14)
 
@@ -84,6 +84,9 @@ def display_reconcile_statements(st: stl, data_db: DbAccess):
                         index_range = range(entry_list_length)
                     addition_list = []
                     defer_list = []
+                    # One model call for every entry in the form
+                    predicted_categories = predict_categories(pd.DataFrame(entry_list[index_range.start:index_range.stop]))
+                    predicted_categories.index = index_range
                     for chosen_entry_index in index_range:
                         chosen_entry = entry_list[chosen_entry_index]
                         st.write('#### Auto Populated Data')
@@ -126,7 +129,7 @@ def display_reconcile_statements(st: stl, data_db: DbAccess):
                         category = left.selectbox(
                             f'Category #{chosen_entry_index}',
                             category_options,
-                            index=list(category_options).index(data_db.category_map[predict_category(chosen_entry)])
+                            index=list(category_options).index(data_db.category_map[predicted_categories[chosen_entry_index]])
                         )
                         method = right.selectbox(
                             f'Method #{chosen_entry_index}',
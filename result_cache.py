@@ -0,0 +1,79 @@
+""" Read-through result cache for DbAccess """
+
+from collections import OrderedDict
+import copy
+import functools
+
+import numpy as np
+import pandas as pd
+
+def freeze(value):
+    """ Hashable stand-in for a query argument """
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series, pd.Index)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+class ResultCache(object):
+    """ LRU cache of query results tagged with the tables they read """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """ Copy of the cached result, or None """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(self.entries[key][1])
+
+    def put(self, key, tables: tuple, value):
+        if self.max_entries < 1:
+            return
+        self.entries[key] = (tables, copy.deepcopy(value))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tables: set):
+        stale_keys = [key for key, (key_tables, _) in self.entries.items() if tables.intersection(key_tables)]
+        for key in stale_keys:
+            self.entries.pop(key)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+def cached_read(*tables):
+    """ Cache a DbAccess read method, invalidated by writes to tables """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def inner(self, *args, **kwargs):
+            self.validate_cache()
+            key = (func.__name__, freeze(args), freeze(kwargs))
+            result = self.result_cache.get(key)
+            if result is None:
+                result = func(self, *args, **kwargs)
+                self.result_cache.put(key, tables, result)
+            return result
+
+        return inner
+
+    return decorator
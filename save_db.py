@@ -3,6 +3,7 @@
 from datetime import date
 from pathlib import Path
 import shutil
+import sqlite3
 import sys
 import filecmp
 
@@ -12,10 +13,25 @@ SERVER = Path('/Volumes/Media/Expense')
 ASSETS = SERVER / 'assets'
 LOCAL_FILE = 'example.db'
 
+def copy_db(source: Path, destination: Path):
+    """ Copy with the backup API, which includes writes still in the source's WAL """
+    source_con = sqlite3.connect(source)
+    destination_con = sqlite3.connect(destination)
+    source_con.backup(destination_con)
+    # Leave the destination whole in its main file, with no WAL beside it
+    destination_con.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    destination_con.close()
+    source_con.close()
+
+# ml_statement.SVC_MODEL_FILES, not imported so saving does not load the models
 ASSET_LIST = [
-    'statement_scaler.joblib',
     'statement_to_category_model.joblib',
-    'word_list.joblib',
+    'statement_scaler.joblib',
+    'statement_featurizer.joblib',
+]
+# Only there once the online model has been built from ML Management
+OPTIONAL_ASSET_LIST = [
+    'statement_online_model.joblib',
 ]
 
 if action in ['upload', 'upload_db']:
@@ -23,9 +39,12 @@ if action in ['upload', 'upload_db']:
     date_str = date.today().strftime("%Y%m%d")
     new_file = SERVER / f'{date_str}.db'
     print(f'Saving file to {new_file}')
-    shutil.copyfile(LOCAL_FILE, new_file)
+    copy_db(LOCAL_FILE, new_file)
     if action == 'upload':
-        for asset_file in ASSET_LIST:
+        for asset_file in ASSET_LIST + OPTIONAL_ASSET_LIST:
+            if not Path(asset_file).exists():
+                print(f'Skipping {asset_file}, not trained yet')
+                continue
             shutil.copyfile(
                 asset_file,
                 ASSETS / asset_file
@@ -39,10 +58,15 @@ elif action in ['download', 'download_db']:
     server_file_list.sort()
     server_file = server_file_list[-1]
     print(f'Copying {server_file}')
-    shutil.copyfile(server_file, LOCAL_FILE)
+    # Written through SQLite so a stale example.db-wal is not replayed onto it
+    copy_db(server_file, LOCAL_FILE)
     if action == 'download':
-        for asset_file in ASSET_LIST:
+        for asset_file in ASSET_LIST + OPTIONAL_ASSET_LIST:
             server_asset = ASSETS / asset_file
+            if asset_file in OPTIONAL_ASSET_LIST and not server_asset.exists():
+                if Path(asset_file).exists():
+                    print(f'{asset_file} is not on the server, the local one was built from another database')
+                continue
             copy_down = True
             if Path(asset_file).exists():
                 if filecmp.cmp(server_asset, asset_file):
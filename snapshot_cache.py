@@ -0,0 +1,123 @@
+""" Columnar on-disk snapshots of whole tables
+
+Each table is saved as one .npy file per column plus a meta.json holding the
+key it was saved under: the table's change counter from table_versions, its
+row count and max rowid.  A snapshot is used only while that key still
+matches, so a cold start reads unchanged tables from disk instead of through
+SQLite and read_sql_query.  Numeric and date columns are memory-mapped and
+copied into writable arrays; text columns are stored as pickled object
+arrays, which load faster than SQLite can fetch them.
+"""
+
+from pathlib import Path
+import json
+import os
+import uuid
+
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# Bump when the file layout changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 1
+
+def get_table_key(con: sqlite3.Connection, table: str) -> list:
+    """ Key the table's snapshot must match, None without table_versions """
+    try:
+        version = con.execute('SELECT version FROM table_versions WHERE name = ?', (table,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if version is None:
+        return None
+    rows, max_rowid = con.execute(f'SELECT COUNT(*), MAX(rowid) FROM {table}').fetchone()
+    return [SNAPSHOT_FORMAT, pd.__version__, version[0], rows, max_rowid]
+
+def save_column(path: Path, series: pd.Series) -> dict:
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        np.save(path, series.to_numpy().view('int64'))
+        return {'kind': 'datetime', 'dtype': str(series.dtype)}
+    if pd.api.types.is_numeric_dtype(series.dtype) and isinstance(series.dtype, np.dtype):
+        np.save(path, series.to_numpy())
+        return {'kind': 'numeric', 'dtype': str(series.dtype)}
+    np.save(path, series.to_numpy(dtype=object), allow_pickle=True)
+    return {'kind': 'object', 'dtype': str(series.dtype)}
+
+def load_column(path: Path, column: dict) -> pd.Series:
+    if column['kind'] == 'object':
+        return pd.Series(np.load(path, allow_pickle=True), dtype=column['dtype'])
+    values = np.array(np.load(path, mmap_mode='r'))
+    if column['kind'] == 'datetime':
+        values = values.view(column['dtype'])
+    return pd.Series(values, dtype=column['dtype'])
+
+class SnapshotCache(object):
+    """ Whole-table frames saved under directory, one folder per table """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def read_table(self, con: sqlite3.Connection, table: str, load) -> pd.DataFrame:
+        """ load() for the whole table, from the snapshot while it is current """
+        if con.in_transaction:
+            # Uncommitted rows must never be saved under a counter that a
+            # rollback hands out again
+            return load()
+        # One read transaction so the key and the rows agree
+        con.execute('BEGIN')
+        try:
+            key = get_table_key(con, table)
+            if key is None:
+                return load()
+            data = self.load(table, key)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+            data = load()
+            self.save(table, key, data)
+            return data
+        finally:
+            con.commit()
+
+    def load(self, table: str, key: list) -> pd.DataFrame:
+        table_dir = self.directory / table
+        try:
+            with open(table_dir / 'meta.json') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta['key'] != key:
+            return None
+        try:
+            columns = [load_column(table_dir / f"{meta['token']}-{i}.npy", column) for i, column in enumerate(meta['columns'])]
+        except (OSError, ValueError):
+            return None
+        data = pd.concat(columns, axis='columns', ignore_index=True)
+        data.columns = [column['name'] for column in meta['columns']]
+        return data
+
+    def save(self, table: str, key: list, data: pd.DataFrame):
+        table_dir = self.directory / table
+        table_dir.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex
+        columns = []
+        for i, (name, series) in enumerate(data.items()):
+            column = save_column(table_dir / f'{token}-{i}.npy', series)
+            column['name'] = name
+            columns.append(column)
+        # meta.json is swapped in last, readers only follow a finished token
+        temp_meta = table_dir / f'{token}.json'
+        with open(temp_meta, 'w') as meta_file:
+            json.dump({'key': key, 'token': token, 'columns': columns}, meta_file)
+        os.replace(temp_meta, table_dir / 'meta.json')
+        for path in table_dir.glob('*.npy'):
+            if not path.name.startswith(token):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,106 @@
+""" Sparse features for statement categorization
+
+Descriptions are split into words once per batch and each word is looked up
+in the vocabulary, giving a sparse matrix of word presence next to the
+account_id, amount and deferred columns.  Training and prediction build
+their features with the same fitted StatementFeaturizer, which is saved with
+the model.
+
+The online model instead hashes its words, so it needs no vocabulary and
+can keep learning from entries with words it has never seen.  The numeric
+columns are hashed as tokens too, which keeps every feature on the same
+scale for the linear model.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# Numeric statement columns used as features, before the word columns
+NUMERIC_COLUMNS = ['account_id', 'amount', 'deferred']
+# Hashed feature columns of the online model
+HASHED_FEATURES = 2 ** 14
+
+def split_words(descriptions) -> pd.Series:
+    """ One row per word, indexed by the position of its description """
+    words = pd.Series(descriptions, dtype=object).reset_index(drop=True)
+    return words.fillna('').astype(str).str.split(' ').explode()
+
+class StatementFeaturizer(object):
+    """ Word vocabulary of the training descriptions """
+
+    def __init__(self, min_count: int = 2, vocabulary_size: int = None):
+        # Words in fewer than min_count entries are not very unique
+        self.min_count = min_count
+        # Keep only the most common words, all of them if None
+        self.vocabulary_size = vocabulary_size
+        self.vocabulary = {}
+
+    @property
+    def words(self) -> list:
+        return list(self.vocabulary)
+
+    @property
+    def feature_names(self) -> list:
+        return NUMERIC_COLUMNS + [f'{word}_present' for word in self.vocabulary]
+
+    def fit(self, descriptions):
+        words = split_words(descriptions)
+        # Entries each word is in, as TrainingSet.featurizer counts them
+        entry_words = pd.DataFrame({'entry': words.index, 'word': words.to_numpy()}).drop_duplicates()
+        counts = entry_words['word'].value_counts(sort=False)
+        counts = counts[counts >= self.min_count]
+        if self.vocabulary_size is not None:
+            counts = counts.sort_values(ascending=False, kind='stable').head(self.vocabulary_size)
+        self.vocabulary = {word: column for column, word in enumerate(counts.index)}
+        return self
+
+    def word_matrix(self, descriptions) -> sparse.csr_matrix:
+        words = split_words(descriptions)
+        columns = words.map(self.vocabulary)
+        known = columns.notna().to_numpy()
+        rows = words.index.to_numpy()[known]
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, columns.to_numpy()[known].astype(np.int64))),
+            shape=(len(descriptions), len(self.vocabulary)),
+        )
+        # A word repeated in a description is still just present
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+        return matrix
+
+    def transform(self, statement_df: pd.DataFrame) -> sparse.csr_matrix:
+        numeric = statement_df[NUMERIC_COLUMNS].astype('float64').fillna(0.0).to_numpy()
+        return sparse.hstack(
+            [sparse.csr_matrix(numeric), self.word_matrix(statement_df['description'].to_numpy())],
+            format='csr',
+        )
+
+    def fit_transform(self, statement_df: pd.DataFrame) -> sparse.csr_matrix:
+        return self.fit(statement_df['description']).transform(statement_df)
+
+def description_words(text: str) -> list:
+    return text.split(' ')
+
+# Stateless, it is built here rather than saved with the model
+HASHER = HashingVectorizer(
+    analyzer=description_words,
+    n_features=HASHED_FEATURES,
+    alternate_sign=False,
+    binary=True,
+)
+
+def hashed_features(statement_df: pd.DataFrame) -> sparse.csr_matrix:
+    """ Hashed words plus account, deferred and amount size tokens, rows scaled to unit length """
+    amounts = statement_df['amount'].astype('float64').fillna(0.0)
+    # Amounts by sign and power of two, so near amounts share a token
+    amount_sizes = np.sign(amounts) * np.floor(np.log2(amounts.abs() + 1.0))
+    # Marked with \x1f so they do not collide with description words
+    documents = (
+        statement_df['description'].fillna('').astype(str)
+        + ' \x1faccount=' + statement_df['account_id'].astype(str)
+        + ' \x1fdeferred=' + statement_df['deferred'].fillna(0).astype(int).astype(str)
+        + ' \x1famount=' + amount_sizes.astype(int).astype(str)
+    )
+    return HASHER.transform(documents.to_numpy())
@@ -0,0 +1,235 @@
+""" Synthetic ledger for benchmarking and fresh databases
+
+The schema mirrors the columns the DbAccess objects read and write.  The
+production database was inherited, so column types follow the few CREATE
+statements recorded in the code (amounts are decimal(10,2), dates are date).
+
+python synthetic_ledger.py <db_file> [tactions] [seed]
+"""
+
+from pathlib import Path
+import datetime
+import random
+import sys
+
+import sqlite3
+
+SCHEMA = [
+    'CREATE TABLE account (id int, name text, balance decimal(10,2), valid int, visibility int, purpose text)',
+    'CREATE TABLE method (id int, name text)',
+    'CREATE TABLE budget (id int, name text, balance decimal(10,2), visibility int, frequency text, increment decimal(10,2), valid int, purpose text)',
+    'CREATE TABLE category (id int, name text, budget_id int, valid int, no_kid_retire int, kid_retire int)',
+    'CREATE TABLE taction (id int, date date, transfer int, account_id int, method_id int, description text, receipt int, valid int, not_real int)',
+    'CREATE TABLE sub (id int, amount decimal(10,2), category_id int, taction_id int, valid int, not_real int, date date)',
+    'CREATE TABLE statement_transactions (id int, date date, statement_month int, statement_year int, account_id int, amount decimal(10,2), description text, taction_id int, deferred int DEFAULT 0)',
+    'CREATE TABLE hsa_distributions (id int, date date, person text, Merchant text, amount decimal(10,2), description text, expense_taction_id int, distribution_taction_id int, receipt_path text, hsa_debit int, dependent_care int, source_id text)',
+    'CREATE TABLE hsa_transactions (id text NOT NULL, date date, amount decimal(10,2), expense_taction_id int(11), distribution_taction_id int(11), receipt_path text, eob_path text, bill_path text)',
+    'CREATE TABLE hsa_receipt_paths (name text, path text)',
+    'CREATE TABLE budget_adjustments (id int, date date, amount decimal(10,2), budget_id int, transfer int, periodic_update int)',
+    'CREATE TABLE budget_profile (budget_id int, ' + ', '.join([f'month_{i} decimal(10,2)' for i in range(1, 13)]) + ')',
+    'CREATE TABLE important_dates (name text, date date)',
+]
+
+METHODS = ['Automated', 'Credit', 'Debit', 'Cash', 'Check']
+MERCHANTS = ['AMAZON', 'KROGER', 'SHELL', 'TARGET', 'COSTCO', 'NETFLIX', 'STARBUCKS', 'WALMART', 'HOME DEPOT', 'PAYROLL']
+MEDICAL_MERCHANTS = ['CVS PHARMACY', 'CITY DENTAL', 'FAMILY CLINIC']
+PEOPLE = ['Adult 1', 'Adult 2', 'Child 1']
+START_DATE = datetime.date(2012, 1, 1)
+LEDGER_DAYS = 3650
+# Rows are written in batches so a million tactions fit in memory
+CHUNK_SIZE = 50000
+
+def create_schema(con: sqlite3.Connection):
+    for statement in SCHEMA:
+        con.execute(statement)
+    con.commit()
+
+def date_text(date: datetime.date) -> str:
+    return f'{date} 00:00:00'
+
+def money_text(cents: int) -> str:
+    return f'{cents / 100:.2f}'
+
+def statement_lag(rng: random.Random) -> int:
+    """ Days until a charge posts, mostly 0-3 with a tail to 10 """
+    return min(int(rng.expovariate(0.5)), 10)
+
+def build_ledger(
+    db_file: Path,
+    tactions: int,
+    seed: int = 0,
+    accounts: int = 5,
+    budgets: int = 10,
+    categories: int = 40,
+    statement_ratio: float = 0.9,
+    unassigned_ratio: float = 0.02,
+    transfer_ratio: float = 0.03,
+    hsa_ratio: float = 0.005):
+    """ Write a ledger with the given number of tactions to db_file
+
+    Tactions are spread over ten years in id order and split into one to
+    three subs.  statement_ratio of the valid ones have a statement entry
+    posted a few days later, unassigned_ratio more statement entries have
+    no taction yet (some deferred), transfer_ratio of the tactions are
+    transfer pairs between accounts and hsa_ratio are medical expenses
+    with an HSA distribution.
+    """
+    rng = random.Random(seed)
+    con = sqlite3.connect(db_file)
+    create_schema(con)
+    transfer_category = categories
+    con.executemany(
+        'INSERT INTO method VALUES (?, ?)',
+        list(enumerate(METHODS)),
+    )
+    con.executemany(
+        'INSERT INTO category VALUES (?, ?, ?, 1, 1, 1)',
+        [(i, f'Category {i}', i % budgets) for i in range(categories)] + [(transfer_category, 'Transfer', 0)],
+    )
+
+    account_cents = [0] * accounts
+    budget_cents = [0] * budgets
+    rows = {'taction': [], 'sub': [], 'statement_transactions': [], 'hsa_distributions': [], 'hsa_transactions': []}
+    placeholders = {table: ', '.join(['?'] * count) for table, count in [
+        ('taction', 9), ('sub', 7), ('statement_transactions', 9), ('hsa_distributions', 12), ('hsa_transactions', 8),
+    ]}
+
+    def flush():
+        for table, table_rows in rows.items():
+            con.executemany(f'INSERT INTO {table} VALUES ({placeholders[table]})', table_rows)
+            table_rows.clear()
+
+    sub_id = 0
+    statement_id = 0
+    hsa_id = 0
+
+    def add_statement(date: datetime.date, account_id: int, cents: int, description: str, taction_id, deferred: int = 0):
+        nonlocal statement_id
+        statement_date = date + datetime.timedelta(days=statement_lag(rng))
+        rows['statement_transactions'].append((
+            statement_id,
+            date_text(statement_date),
+            statement_date.month,
+            statement_date.year,
+            account_id,
+            money_text(cents),
+            description,
+            taction_id,
+            deferred,
+        ))
+        statement_id += 1
+
+    taction_id = 0
+    while taction_id < tactions:
+        date = START_DATE + datetime.timedelta(days=taction_id * LEDGER_DAYS // tactions + rng.randrange(3))
+        account_id = rng.randrange(accounts)
+        valid = 0 if rng.random() < 0.02 else 1
+        if rng.random() < transfer_ratio and taction_id + 1 < tactions:
+            # Both sides of a transfer, as DbAccess.add_transfer writes them
+            cents = rng.randrange(1000, 200000)
+            deposit_account_id = (account_id + 1 + rng.randrange(accounts - 1)) % accounts if accounts > 1 else account_id
+            for side_account_id, side_cents in [(account_id, -cents), (deposit_account_id, cents)]:
+                rows['taction'].append((taction_id, date_text(date), 1, side_account_id, 0, 'Transfer', 0, 1, 0))
+                rows['sub'].append((sub_id, money_text(side_cents), transfer_category, taction_id, 1, 0, date_text(date)))
+                account_cents[side_account_id] += side_cents
+                add_statement(date, side_account_id, side_cents, 'ONLINE TRANSFER', taction_id)
+                sub_id += 1
+                taction_id += 1
+            continue
+
+        merchant = rng.choice(MERCHANTS)
+        if merchant == 'PAYROLL':
+            splits = [rng.randrange(100000, 500000)]
+        else:
+            splits = [-rng.randrange(1, 20000) for _ in range(rng.choice([1, 1, 1, 2, 3]))]
+        description = f'{merchant} #{rng.randrange(1000)}'
+        rows['taction'].append((taction_id, date_text(date), 0, account_id, rng.randrange(len(METHODS)), description, 0, valid, 0))
+        for cents in splits:
+            category_id = rng.randrange(categories)
+            rows['sub'].append((sub_id, money_text(cents), category_id, taction_id, valid, 0, date_text(date)))
+            sub_id += 1
+            if valid:
+                budget_cents[category_id % budgets] += cents
+        if valid:
+            account_cents[account_id] += sum(splits)
+            if rng.random() < statement_ratio:
+                add_statement(date, account_id, sum(splits), description, taction_id)
+        if rng.random() < unassigned_ratio:
+            deferred = 1 if rng.random() < 0.25 else 0
+            add_statement(date, account_id, -rng.randrange(1, 20000), f'{rng.choice(MERCHANTS)} #{rng.randrange(1000)}', None, deferred)
+        if valid and rng.random() < hsa_ratio:
+            merchant = rng.choice(MEDICAL_MERCHANTS)
+            rows['hsa_distributions'].append((
+                hsa_id,
+                date_text(date),
+                rng.choice(PEOPLE),
+                merchant,
+                money_text(-sum(splits)),
+                f'{merchant} visit',
+                taction_id,
+                None,
+                f'receipts/{hsa_id}.pdf',
+                rng.randrange(2),
+                0,
+                f'synthetic-{hsa_id}',
+            ))
+            rows['hsa_transactions'].append((
+                f'HSA{hsa_id}',
+                date_text(date),
+                money_text(sum(splits)),
+                taction_id,
+                None,
+                f'receipts/{hsa_id}.pdf',
+                None,
+                None,
+            ))
+            hsa_id += 1
+        taction_id += 1
+        if len(rows['taction']) >= CHUNK_SIZE:
+            flush()
+    flush()
+
+    # Monthly budget increments over the same ten years
+    adjustments = []
+    for month in range(LEDGER_DAYS // 30):
+        date = START_DATE + datetime.timedelta(days=month * 30)
+        for budget_id in range(budgets):
+            adjustments.append((len(adjustments), date_text(date), '100.00', budget_id, 0, 1))
+            budget_cents[budget_id] += 10000
+    con.executemany('INSERT INTO budget_adjustments VALUES (?, ?, ?, ?, ?, ?)', adjustments)
+
+    con.executemany(
+        'INSERT INTO account VALUES (?, ?, ?, 1, 1, ?)',
+        [(i, f'Account {i}', money_text(account_cents[i]), 'synthetic') for i in range(accounts)],
+    )
+    con.executemany(
+        "INSERT INTO budget VALUES (?, ?, ?, 1, 'M', '100.00', 1, 'synthetic')",
+        [(i, f'Budget {i}', money_text(budget_cents[i])) for i in range(budgets)],
+    )
+    con.executemany(
+        f"INSERT INTO budget_profile VALUES (?{', ?' * 12})",
+        [(i, *(['100.00'] * 12)) for i in range(budgets)],
+    )
+    con.executemany(
+        'INSERT INTO hsa_receipt_paths VALUES (?, ?)',
+        [('receipts', 'receipts'), ('eobs', 'eobs')],
+    )
+    con.execute("INSERT INTO important_dates VALUES ('last_budget_update', '2022-01-01 00:00:00')")
+    con.commit()
+    con.close()
+
+if __name__ == '__main__':
+    db_file = Path(sys.argv[1])
+    if db_file.exists():
+        print(f'{db_file} already exists')
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        tactions = int(sys.argv[2])
+    else:
+        tactions = 10000
+    if len(sys.argv) > 3:
+        seed = int(sys.argv[3])
+    else:
+        seed = 0
+    build_ledger(db_file, tactions, seed=seed)
+    print(f'Wrote {tactions} tactions to {db_file}')
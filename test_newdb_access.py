@@ -0,0 +1,47 @@
+""" DbAccess tests on small synthetic ledgers """
+
+from decimal import Decimal
+
+import pytest
+
+from newdb_access import DbAccess
+from write_queue import WriteQueue
+
+def test_queued_writes_with_default_arguments(db_file):
+    db = DbAccess(db_file, write_queue=WriteQueue(db_file))
+    db.update_account(Decimal('1.00'), 'Account 0')
+    with db.transaction():
+        db.update_account(Decimal('1.00'), 'Account 0')
+    assert db.write_queue.stats()['writes'] == 2
+
+def test_labeled_statements_ignore_invalid_and_not_real_subs(db_file):
+    db = DbAccess(db_file)
+    labeled = db.get_labeled_statements().set_index('id')
+    statement_ids = list(labeled.index[:2])
+    for statement_id, valid, not_real in [(statement_ids[0], True, True), (statement_ids[1], False, False)]:
+        statement = labeled.loc[statement_id]
+        other_category_id = int(statement['category_id'] + 1) % 40
+        db.add_sub(Decimal('-1.00'), other_category_id, int(statement['taction_id']), valid, not_real, str(statement['date']))
+    relabeled = db.get_labeled_statements(statement_ids).set_index('id')
+    assert list(relabeled.index) == statement_ids
+    assert list(relabeled['category_id']) == list(labeled.loc[statement_ids, 'category_id'])
+
+def test_rolled_back_queued_write_clears_cache(db_file):
+    db = DbAccess(db_file, write_queue=WriteQueue(db_file))
+    # Allocates the id, then fails looking the budget up
+    with pytest.raises(KeyError):
+        db.add_category('Rolled Back', 'No Such Budget')
+    assert db.cache_stats()['entries'] == 0
+
+def test_deleted_statement_loses_its_predictions(db_file):
+    db = DbAccess(db_file)
+    for _ in range(2):
+        db.add_statement_transaction('2020-01-01 00:00:00', 1, 2020, 0, Decimal('-1.00'), description='unassigned')
+    statement_ids = list(db.get_statement_transactions(include_assigned=False)['id'].tail(2))
+    db.put_statement_predictions('model', statement_ids, [1, 2], [0.5, 0.5])
+    db.delete_statement_transaction(statement_ids[0])
+    predicted = db.get_statement_transactions(include_assigned=False, model_hash='model').set_index('id')
+    assert statement_ids[0] not in predicted.index
+    assert predicted.loc[statement_ids[1], 'predicted_category_id'] == 2
+    stored = db.con.execute('SELECT statement_id FROM statement_predictions').fetchall()
+    assert stored == [(statement_ids[1],)]
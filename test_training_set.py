@@ -0,0 +1,30 @@
+""" Incremental training set tests on small synthetic ledgers """
+
+from newdb_access import DbAccess
+from training_set import load_training_set
+
+def labels(training_set) -> dict:
+    return dict(zip(training_set.statement_ids, training_set.labels))
+
+def test_invalidated_subs_update_labels(db_file, tmp_path):
+    db = DbAccess(db_file)
+    path = tmp_path / 'training_set.npz'
+    before = labels(load_training_set(db, path))
+    subs = db.get_subtotals()
+    sub_counts = subs['taction_id'].value_counts()
+    statements = db.get_statement_transactions()
+    # A labeled entry's transaction is deleted, an unlabeled one keeps one of two subs
+    single = subs.loc[subs['taction_id'].map(sub_counts) == 1]
+    dropped = statements.loc[statements['taction_id'].isin(single['taction_id'])].iloc[0]
+    double = subs.loc[subs['taction_id'].map(sub_counts) == 2]
+    relabeled = statements.loc[statements['taction_id'].isin(double['taction_id'])].iloc[0]
+    kept_sub, invalid_sub = double.loc[double['taction_id'] == relabeled['taction_id']].to_dict(orient='records')
+    assert dropped['id'] in before and relabeled['id'] not in before
+
+    db.delete_transaction(int(dropped['taction_id']))
+    db.update_sub(int(invalid_sub['id']), valid=False, not_real=False)
+    after = labels(load_training_set(db, path))
+    assert dropped['id'] not in after
+    assert after[relabeled['id']] == kept_sub['category_id']
+    labeled = db.get_labeled_statements()
+    assert after == dict(zip(labeled['id'], labeled['category_id']))
@@ -0,0 +1,156 @@
+""" Statement model training set kept on disk between retrains
+
+The labeled entries are stored as word presence over every word seen so
+far, the numeric feature columns, category labels and statement ids.  An
+update reads only the entries the statement_label_log names since the seq
+the set was saved at, drops their old rows and appends them again, so a
+retrain pays for what changed rather than the whole history.  New words get
+new columns at the end.  The model's vocabulary is chosen at train time
+from the stored word counts.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from newdb_access import DbAccess
+from statement_features import NUMERIC_COLUMNS, StatementFeaturizer, split_words
+
+# Saved sets of another version are read in full again.  2 labels from
+# valid, real subs only.
+TRAINING_SET_VERSION = 2
+
+class TrainingSet(object):
+    """ Labeled statement entries of one database """
+
+    def __init__(self, db_name: str = None):
+        self.db_name = db_name
+        self.version = TRAINING_SET_VERSION
+        self.words = []
+        self.columns = {}
+        self.word_matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self.numeric = np.zeros((0, len(NUMERIC_COLUMNS)))
+        self.labels = np.zeros(0, dtype=np.int64)
+        self.statement_ids = np.zeros(0, dtype=np.int64)
+        # statement_label_log seq the set is up to date with, None until read
+        self.seq = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path) as saved:
+            training_set = cls(str(saved['db_name']))
+            training_set.version = int(saved['version']) if 'version' in saved else 1
+            training_set.words = [str(word) for word in saved['words']]
+            training_set.columns = {word: column for column, word in enumerate(training_set.words)}
+            training_set.word_matrix = sparse.csr_matrix(
+                (saved['data'], saved['indices'], saved['indptr']),
+                shape=tuple(saved['shape']),
+            )
+            training_set.numeric = saved['numeric']
+            training_set.labels = saved['labels']
+            training_set.statement_ids = saved['statement_ids']
+            training_set.seq = int(saved['seq'])
+        return training_set
+
+    def save(self, path: Path):
+        # Written beside the old file and swapped in, a failed save keeps it
+        temp_path = Path(f'{path}.tmp.npz')
+        np.savez(
+            temp_path,
+            db_name=np.array(self.db_name),
+            version=np.array(self.version),
+            words=np.array(self.words, dtype=str),
+            data=self.word_matrix.data,
+            indices=self.word_matrix.indices,
+            indptr=self.word_matrix.indptr,
+            shape=np.array(self.word_matrix.shape),
+            numeric=self.numeric,
+            labels=self.labels,
+            statement_ids=self.statement_ids,
+            seq=np.array(self.seq),
+        )
+        temp_path.replace(path)
+
+    def _drop(self, statement_ids: list):
+        keep = ~np.isin(self.statement_ids, statement_ids)
+        self.word_matrix = self.word_matrix[keep]
+        self.numeric = self.numeric[keep]
+        self.labels = self.labels[keep]
+        self.statement_ids = self.statement_ids[keep]
+
+    def _append(self, labeled: pd.DataFrame):
+        new_words = split_words(labeled['description']).drop_duplicates()
+        new_words = new_words.loc[~new_words.isin(self.columns)]
+        for word in new_words:
+            self.columns[word] = len(self.words)
+            self.words.append(word)
+        featurizer = StatementFeaturizer()
+        featurizer.vocabulary = self.columns
+        word_matrix = self.word_matrix.copy()
+        word_matrix.resize((word_matrix.shape[0], len(self.words)))
+        self.word_matrix = sparse.vstack([word_matrix, featurizer.word_matrix(labeled['description'].to_numpy())], format='csr')
+        self.numeric = np.vstack([self.numeric, labeled[NUMERIC_COLUMNS].astype('float64').fillna(0.0).to_numpy()])
+        self.labels = np.concatenate([self.labels, labeled['category_id'].to_numpy(dtype=np.int64)])
+        self.statement_ids = np.concatenate([self.statement_ids, labeled['id'].to_numpy(dtype=np.int64)])
+
+    def update(self, db: DbAccess) -> int:
+        """ Bring the set up to date with db, returns the entries read
+
+        Reads everything the first time, or when the log no longer goes back
+        to self.seq.
+        """
+        statement_ids, last_seq = db.get_label_changes(-1 if self.seq is None else self.seq)
+        if self.seq is None or statement_ids is None:
+            self._drop(self.statement_ids)
+            labeled = db.get_labeled_statements()
+        elif len(statement_ids) == 0:
+            self.seq = last_seq
+            return 0
+        else:
+            self._drop(statement_ids)
+            labeled = db.get_labeled_statements(statement_ids)
+        self._append(labeled)
+        self.seq = last_seq
+        return len(labeled)
+
+    def featurizer(self, min_count: int = 2) -> StatementFeaturizer:
+        """ Featurizer over the words in at least min_count entries, in first seen order """
+        counts = np.asarray(self.word_matrix.sum(axis=0)).ravel()
+        featurizer = StatementFeaturizer(min_count=min_count)
+        featurizer.vocabulary = {
+            self.words[column]: position
+            for position, column in enumerate(np.flatnonzero(counts >= min_count))
+        }
+        return featurizer
+
+    def features(self, featurizer: StatementFeaturizer) -> sparse.csr_matrix:
+        """ What featurizer.transform gives for the stored entries """
+        columns = [self.columns[word] for word in featurizer.vocabulary]
+        return sparse.hstack(
+            [sparse.csr_matrix(self.numeric), self.word_matrix[:, columns]],
+            format='csr',
+        )
+
+def db_name(db: DbAccess) -> str:
+    return db.con.execute('PRAGMA database_list').fetchone()[2]
+
+def load_training_set(db: DbAccess, path: Path) -> TrainingSet:
+    """ The saved set for db brought up to date, or a new one read in full """
+    name = db_name(db)
+    training_set = None
+    if Path(path).exists():
+        training_set = TrainingSet.load(path)
+        if training_set.db_name != name or training_set.version != TRAINING_SET_VERSION:
+            training_set = None
+    if training_set is None:
+        training_set = TrainingSet(name)
+    training_set.update(db)
+    training_set.save(path)
+    # The saved set no longer needs the log it has read
+    db.prune_label_log(training_set.seq)
+    return training_set
@@ -3,10 +3,11 @@
 import pandas as pd
 
 from newdb_access import DbAccess
+from money import amounts_to_float
 
 def translate_statement_transactions(data: pd.DataFrame, sort_column: str = 'date') -> pd.DataFrame:
     data = data.drop(['statement_month', 'statement_year'], axis='columns')
-    data['amount'] = data['amount'].astype(float)
+    data['amount'] = amounts_to_float(data['amount'])
     data = data.sort_values(sort_column, ascending=False)
     data = data.style\
         .format(precision=0, subset=['taction_id'])\
@@ -16,15 +17,15 @@ def translate_statement_transactions(data: pd.DataFrame, sort_column: str = 'dat
 
 def translate_transactions(data: pd.DataFrame, db: DbAccess = None) -> pd.DataFrame:
     data['not_real'] = data['not_real'].fillna(0).astype(int)
-    data['amount'] = data['amount'].astype(float)
+    data['amount'] = amounts_to_float(data['amount'])
     if 'balance' in data.columns:
-        data['balance'] = data['balance'].astype(float)
+        data['balance'] = amounts_to_float(data['balance'])
     if db is not None:
-        data['account_id'] = data['account_id'].apply(db.account_translate, args=('name',))
-        data['method_id'] = data['method_id'].apply(db.method_translate, args=('name',))
+        data['account_id'] = db.translate_series(data['account_id'], 'account', 'name')
+        data['method_id'] = db.translate_series(data['method_id'], 'method', 'name')
         subs = db.get_subtotals()
         filtered_subs = subs.loc[subs['taction_id'].isin(data['taction_id']), :]
-        filtered_subs['category'] = filtered_subs['category_id'].apply(db.category_translate, args=('name',))
+        filtered_subs['category'] = db.translate_series(filtered_subs['category_id'], 'category', 'name')
         grouped = filtered_subs[['taction_id', 'category']].groupby('taction_id')['category'].apply(','.join)
         data = data.join(grouped, on='taction_id', how='left')
     data = data.sort_values('date', ascending=False)
@@ -34,14 +35,14 @@ def translate_transactions(data: pd.DataFrame, db: DbAccess = None) -> pd.DataFr
     return styled_data
 
 def translate_accounts(data: pd.DataFrame) -> pd.DataFrame:
-    data['balance'] = data['balance'].astype(float)
+    data['balance'] = amounts_to_float(data['balance'])
     return data
 
 def translate_budgets(data: pd.DataFrame) -> pd.DataFrame:
-    data['balance'] = data['balance'].astype(float)
-    data['increment'] = data['increment'].astype(float)
+    data['balance'] = amounts_to_float(data['balance'])
+    data['increment'] = amounts_to_float(data['increment'])
     return data
 
 def translate_hsa(data: pd.DataFrame) -> pd.DataFrame:
-    data['amount'] = data['amount'].astype(float)
+    data['amount'] = amounts_to_float(data['amount'])
     return data
\ No newline at end of file
@@ -84,8 +84,8 @@ def show_date_range(db: DbAccess, start_month: int, start_year: int, end_month:
         after_date=pd.to_datetime(f'{start_month}/1/{start_year}'),
         before_date=pd.to_datetime(f'{end_month}/1/{end_year}')
     )
-    subs['category'] = subs['category_id'].apply(db.category_translate, args=('name',))
-    subs['budget_id'] = subs['category_id'].apply(db.get_budget_from_category)
+    subs['category'] = db.translate_series(subs['category_id'], 'category', 'name')
+    subs['budget_id'] = db.get_budgets_from_categories(subs['category_id'])
     subs['float_amount'] = subs['amount'].astype(float)
     #st.write(subs)
     grouped_subs = subs.groupby('category').sum().reset_index(drop=False)
@@ -129,8 +129,8 @@ def show_month(db: DbAccess, month: int, year: int):
     ))
 
     subs = db.get_subtotals(in_taction_list=transactions['taction_id'].values)
-    subs['category'] = subs['category_id'].apply(db.category_translate, args=('name',))
-    subs['budget_id'] = subs['category_id'].apply(db.get_budget_from_category)
+    subs['category'] = db.translate_series(subs['category_id'], 'category', 'name')
+    subs['budget_id'] = db.get_budgets_from_categories(subs['category_id'])
     #subs['budget'] = subs['budget_id'].apply(db.budget_translate, args=('name',))
     subs['group_type'] = 'expenses'
     subs.loc[subs['amount'] > ZERO, 'group_type'] = 'incomes'
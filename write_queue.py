@@ -0,0 +1,203 @@
+""" Single writer per database file
+
+Every Streamlit session runs in the same process, each with its own
+DbAccess.  When they commit on their own connections at once, SQLite
+answers the loser with 'database is locked'.  A WriteQueue instead owns the
+only writing connection in the process and runs every write on its thread.
+Writes queued while one batch commits are grouped into the next single
+transaction, each inside a savepoint so a failing write only undoes itself,
+and each caller is answered once its batch has committed.  A job's
+on_rollback is called when its savepoint or its whole batch is rolled back,
+so whatever it cached from its uncommitted writes can be dropped.
+
+DbAccess write methods marked with queued_write go through the queue when
+the DbAccess was given one.
+"""
+
+from concurrent.futures import Future
+from pathlib import Path
+import atexit
+import contextlib
+import functools
+import queue
+import threading
+
+import sqlite3
+
+# Most writes grouped into one transaction
+MAX_BATCH = 256
+
+class WriteQueue(object):
+    """ Writer thread with its own connection to db_file """
+
+    def __init__(self, db_file: Path, timeout: float = 30.0, max_batch: int = MAX_BATCH):
+        # Autocommit mode, the writer issues BEGIN and COMMIT itself.  Only
+        # the writer thread uses the connection, or a hold() block while
+        # the writer thread waits on it.
+        self.con = sqlite3.connect(db_file, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self.con.execute('PRAGMA journal_mode=WAL')
+        self.con.execute('PRAGMA synchronous=NORMAL')
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        self.batches = 0
+        self.writes = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=f'writer {Path(db_file).name}', daemon=True)
+        self.thread.start()
+
+    def submit(self, work, on_rollback=None) -> Future:
+        """ Queue work(con), the future is done once its batch has committed """
+        if self.closed:
+            raise sqlite3.ProgrammingError('Write queue is closed')
+        future = Future()
+        self.jobs.put((work, future, on_rollback))
+        return future
+
+    def run(self, work, on_rollback=None):
+        """ work(con) on the writer, waiting for its commit """
+        return self.submit(work, on_rollback).result()
+
+    @contextlib.contextmanager
+    def hold(self, on_rollback=None):
+        """ Run the with block on the writer's connection as one queued write
+
+        The writer thread waits while the block runs, so the block's
+        statements are one job of the batch and commit with it.
+        """
+        started = threading.Event()
+        finished = threading.Event()
+        outcome = {}
+
+        def work(con: sqlite3.Connection):
+            started.set()
+            finished.wait()
+            if 'error' in outcome:
+                raise outcome['error']
+
+        future = self.submit(work, on_rollback)
+        while not started.wait(0.1):
+            if future.done():
+                # The batch failed before the block could start
+                future.result()
+        try:
+            yield self.con
+        except BaseException as error:
+            outcome['error'] = error
+            finished.set()
+            try:
+                future.result()
+            except BaseException:
+                pass
+            raise
+        finished.set()
+        future.result()
+
+    def close(self):
+        """ Write what is queued, checkpoint the WAL into the file and stop the writer """
+        if self.closed:
+            return
+        self.closed = True
+        self.jobs.put(None)
+        self.thread.join()
+
+    def _next_batch(self) -> list:
+        """ Queued jobs, ending with None when close() stops the writer """
+        batch = [self.jobs.get()]
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                batch.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+                if len(batch) == 0:
+                    break
+            try:
+                outcomes = self._write_batch(batch)
+            except sqlite3.Error as error:
+                if self.con.in_transaction:
+                    self.con.execute('ROLLBACK')
+                for work, future, on_rollback in batch:
+                    if on_rollback is not None:
+                        on_rollback()
+                outcomes = [(future, None, error) for work, future, on_rollback in batch]
+            self.batches += 1
+            self.writes += len(batch)
+            for future, result, error in outcomes:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            if stopping:
+                break
+        # Copies of the file alone then hold every committed write
+        self.con.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.con.close()
+        # Submitted while close() was stopping the writer
+        while not self.jobs.empty():
+            job = self.jobs.get_nowait()
+            if job is not None:
+                job[1].set_exception(sqlite3.ProgrammingError('Write queue is closed'))
+
+    def _write_batch(self, batch: list) -> list:
+        """ (future, result, error) of each job, all committed together """
+        self.con.execute('BEGIN IMMEDIATE')
+        outcomes = []
+        for work, future, on_rollback in batch:
+            self.con.execute('SAVEPOINT queued_write')
+            try:
+                result = work(self.con)
+            except BaseException as error:
+                self.con.execute('ROLLBACK TO queued_write')
+                self.con.execute('RELEASE queued_write')
+                if on_rollback is not None:
+                    on_rollback()
+                outcomes.append((future, None, error))
+            else:
+                self.con.execute('RELEASE queued_write')
+                outcomes.append((future, result, None))
+        self.con.execute('COMMIT')
+        return outcomes
+
+    def stats(self) -> dict:
+        return {'batches': self.batches, 'writes': self.writes, 'queued': self.jobs.qsize()}
+
+# One queue per database file in the process
+_queues = {}
+_queues_lock = threading.Lock()
+
+def shared_queue(db_file: Path, timeout: float = 30.0) -> WriteQueue:
+    key = str(Path(db_file).resolve())
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = WriteQueue(db_file, timeout=timeout)
+        return _queues[key]
+
+@atexit.register
+def close_shared_queues():
+    with _queues_lock:
+        for write_queue in _queues.values():
+            write_queue.close()
+
+def queued_write(func):
+    """ Run a DbAccess write method on its write queue, if it has one """
+
+    @functools.wraps(func)
+    def inner(self, *args, **kwargs):
+        if self.write_queue is None or self.writer_con is not None:
+            # No queue, or already running on the writer
+            return func(self, *args, **kwargs)
+
+        def work(con: sqlite3.Connection):
+            with self.on_writer(con):
+                return func(self, *args, **kwargs)
+
+        return self.write_queue.run(work, on_rollback=self._forget_cache)
+
+    return inner